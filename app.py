@@ -1,61 +1,257 @@
-from flask import Flask, jsonify, request, session, render_template
+from flask import Flask, Blueprint, current_app, jsonify, request, session, render_template, Response, stream_with_context, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, timezone
 import os
+import sys
 import requests
 import openai
 import json
 import atexit
+import base64
+import re
+import threading
+import time
+import uuid
+import hashlib
+import random
+import sqlite3
+import io
+import socket
+import hmac
+import click
+import math
+import heapq
+import bisect
+from collections import OrderedDict
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
-from newsapi import NewsApiClient
 from apscheduler.schedulers.background import BackgroundScheduler
 
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
 # Load environment variables from .env file
 load_dotenv()
 
-app = Flask(__name__)
+# Routes live on a blueprint; create_app() at the bottom of this file builds
+# the application. Under gunicorn: gunicorn -w 4 'app:create_app()'
+db = SQLAlchemy()
+bp = Blueprint('blog', __name__, cli_group=None)
+
+# Connection pool for server databases (Postgres etc.). SQLite gets WAL mode
+# and a busy timeout instead, so readers never block on the writer and
+# concurrent writers wait rather than fail.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_TIMEOUT_SECONDS', 10))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv('DB_POOL_RECYCLE_SECONDS', 1800))
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv('SQLITE_BUSY_TIMEOUT_SECONDS', 15))
+
+# Every process may start the scheduler; a lock row in the database makes
+# sure only one of them runs jobs at a time (see LeaderScheduler)
+RUN_SCHEDULER = os.getenv('RUN_SCHEDULER', '1') == '1'
+SCHEDULER_LOCK_TTL_SECONDS = float(os.getenv('SCHEDULER_LOCK_TTL_SECONDS', 60))
+NEWS_FETCH_INTERVAL_MINUTES = int(os.getenv('NEWS_FETCH_INTERVAL_MINUTES', 5))
+# Apply pending migrations when the app starts (`flask migrate` otherwise).
+# Processes booting together take turns through migration_lock().
+AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', '1') == '1'
+MIGRATION_LOCK_TIMEOUT_SECONDS = int(os.getenv('MIGRATION_LOCK_TIMEOUT_SECONDS', 300))
+MIGRATION_LOCK_NAME = 'ai_blogify_migrations'
+MIGRATION_LOCK_KEY = 7310420115  # pg_advisory_lock key
+
+def engine_options(database_uri):
+    if database_uri.startswith('sqlite'):
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_SECONDS}}
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT_SECONDS,
+        'pool_recycle': DB_POOL_RECYCLE_SECONDS,
+        'pool_pre_ping': True
+    }
 
-# Use environment variables for configuration
-app.secret_key = os.getenv('SECRET_KEY', 'super-secret-key-fallback')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///blog.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
+@event.listens_for(Engine, 'connect')
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_SECONDS * 1000)}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
 
-db = SQLAlchemy(app)
-CORS(app)
+# Outbound HTTP: pooled connections, timeouts, retries with jittered
+# exponential backoff on 429/5xx, and a circuit breaker per upstream
+OUTBOUND_POOL_SIZE = int(os.getenv('OUTBOUND_POOL_SIZE', 10))
+OUTBOUND_CONNECT_TIMEOUT_SECONDS = float(os.getenv('OUTBOUND_CONNECT_TIMEOUT_SECONDS', 3.05))
+OUTBOUND_READ_TIMEOUT_SECONDS = float(os.getenv('OUTBOUND_READ_TIMEOUT_SECONDS', 10))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv('OPENAI_TIMEOUT_SECONDS', 60))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', 2))
+OUTBOUND_BACKOFF_BASE_SECONDS = float(os.getenv('OUTBOUND_BACKOFF_BASE_SECONDS', 0.5))
+OUTBOUND_BACKOFF_MAX_SECONDS = float(os.getenv('OUTBOUND_BACKOFF_MAX_SECONDS', 8))
+CIRCUIT_BREAKER_FAILURES = int(os.getenv('CIRCUIT_BREAKER_FAILURES', 5))
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv('CIRCUIT_BREAKER_RESET_SECONDS', 30))
 
-# Initialize API clients
+# Initialize API clients. Startup warnings go to stderr so CLI output (e.g.
+# `flask export-posts > dump.ndjson`) stays clean.
+# The OpenAI client also honours OPENAI_BASE_URL, e.g. to point it at a local stub.
+# It pools connections and retries 429/5xx with jittered backoff itself.
 openai_api_key = os.getenv('OPENAI_API_KEY')
-openai_client = openai.OpenAI(api_key=openai_api_key) if openai_api_key else None
+openai_client = openai.OpenAI(
+    api_key=openai_api_key,
+    timeout=openai.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OUTBOUND_CONNECT_TIMEOUT_SECONDS),
+    max_retries=OUTBOUND_MAX_RETRIES
+) if openai_api_key else None
 if not openai_client:
-    print("Warning: OPENAI_API_KEY not found in .env. AI generation will not work.")
+    print("Warning: OPENAI_API_KEY not found in .env. AI generation will not work.", file=sys.stderr)
 
 PEXELS_API_KEY = os.getenv('PEXELS_API_KEY')
+PEXELS_API_URL = os.getenv('PEXELS_API_URL', 'https://api.pexels.com/v1/search')
 if not PEXELS_API_KEY:
-    print("Warning: PEXELS_API_KEY not found in .env. Pexels image search will not work.")
+    print("Warning: PEXELS_API_KEY not found in .env. Pexels image search will not work.", file=sys.stderr)
 
 NEWS_API_KEY = os.getenv('NEWS_API_KEY')
-newsapi_client = NewsApiClient(api_key=NEWS_API_KEY) if NEWS_API_KEY else None
-if not newsapi_client:
-    print("Warning: NEWS_API_KEY not found in .env. News fetching will not work.")
+NEWS_API_URL = os.getenv('NEWS_API_URL', 'https://newsapi.org/v2/top-headlines')
+if not NEWS_API_KEY:
+    print("Warning: NEWS_API_KEY not found in .env. News fetching will not work.", file=sys.stderr)
+
+if Image is None:
+    print("Warning: Pillow is not installed. Post images will be hotlinked instead of served locally.", file=sys.stderr)
+
+# Post images are downloaded once, resized into WebP variants and served from
+# IMAGE_UPLOAD_DIR, content-addressed by the sha256 of the original
+IMAGE_UPLOAD_DIR = os.getenv('IMAGE_UPLOAD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'images'))
+IMAGE_UPLOAD_URL = os.getenv('IMAGE_UPLOAD_URL', '/static/uploads/images')
+# Only images from these hosts are downloaded (comma-separated, '*' for any);
+# other URLs stay hotlinked, so user input can't make the server fetch
+# arbitrary addresses
+IMAGE_INGEST_HOSTS = {host.strip().lower() for host in os.getenv('IMAGE_INGEST_HOSTS', 'images.pexels.com').split(',') if host.strip()}
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_DEFAULT_WIDTH = 640
+IMAGE_WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', 80))
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 15 * 1024 * 1024))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_MAX_ATTEMPTS = 3
+IMAGE_STALE_SECONDS = 600
+IMAGE_BACKFILL_INTERVAL_MINUTES = int(os.getenv('IMAGE_BACKFILL_INTERVAL_MINUTES', 5))
+IMAGE_BACKFILL_BATCH_SIZE = 50
 
 # FastSpring Configuration
 FASTSPRING_STORE_SUBDOMAIN = os.getenv('FASTSPRING_STORE_SUBDOMAIN')
 FASTSPRING_PRODUCT_PATH = os.getenv('FASTSPRING_PRODUCT_PATH')
 FASTSPRING_WEBHOOK_SECRET = os.getenv('FASTSPRING_WEBHOOK_SECRET')
+if not FASTSPRING_WEBHOOK_SECRET:
+    print("Warning: FASTSPRING_WEBHOOK_SECRET not found in .env. FastSpring webhooks will be rejected.", file=sys.stderr)
+
+# Webhook deliveries are recorded by event id and applied in batches off the
+# request path; WEBHOOK_SWEEP_INTERVAL_MINUTES picks up anything a crashed
+# process left pending. Event ids are kept long enough to outlast retries.
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 500))
+WEBHOOK_SWEEP_INTERVAL_MINUTES = int(os.getenv('WEBHOOK_SWEEP_INTERVAL_MINUTES', 5))
+WEBHOOK_EVENT_RETENTION_DAYS = int(os.getenv('WEBHOOK_EVENT_RETENTION_DAYS', 30))
 
 # Define categories for news fetching
 NEWS_CATEGORIES = ['general', 'sports', 'politics', 'gaming', 'entertainment', 'technology', 'science', 'health']
 
+# News pipeline: categories run concurrently, with separate caps on in-flight
+# calls per upstream and a time budget per category
+NEWS_PIPELINE_WORKERS = int(os.getenv('NEWS_PIPELINE_WORKERS', len(NEWS_CATEGORIES)))
+NEWS_API_CONCURRENCY = int(os.getenv('NEWS_API_CONCURRENCY', 4))
+OPENAI_CONCURRENCY = int(os.getenv('OPENAI_CONCURRENCY', 4))
+PEXELS_CONCURRENCY = int(os.getenv('PEXELS_CONCURRENCY', 4))
+NEWS_CATEGORY_TIMEOUT_SECONDS = float(os.getenv('NEWS_CATEGORY_TIMEOUT_SECONDS', 60))
+
+# Batched mode: fetch several headlines per category, drop the ones already
+# published (same normalized headline, or a near-duplicate of a recent one)
+# and write several posts per completion request. NEWS_BATCH_GENERATION=0
+# goes back to one headline and one completion per category.
+NEWS_BATCH_GENERATION = os.getenv('NEWS_BATCH_GENERATION', '1') == '1'
+NEWS_HEADLINES_PER_CATEGORY = int(os.getenv('NEWS_HEADLINES_PER_CATEGORY', 5))
+NEWS_POSTS_PER_CATEGORY = int(os.getenv('NEWS_POSTS_PER_CATEGORY', 1))
+NEWS_POSTS_PER_COMPLETION = int(os.getenv('NEWS_POSTS_PER_COMPLETION', 4))
+NEWS_BATCH_TIMEOUT_SECONDS = float(os.getenv('NEWS_BATCH_TIMEOUT_SECONDS', 180))
+NEWS_DUPLICATE_SIMILARITY = float(os.getenv('NEWS_DUPLICATE_SIMILARITY', 0.5))
+NEWS_DEDUP_LOOKBACK_POSTS = 1000
+
+# Outbound API results (Pexels searches, AI completions) are cached in memory
+# and in a SQLite file, keyed by the normalized request
+API_CACHE_PATH = os.getenv('API_CACHE_PATH')
+API_CACHE_MEMORY_ENTRIES = int(os.getenv('API_CACHE_MEMORY_ENTRIES', 1024))
+API_CACHE_DISK_ENTRIES = int(os.getenv('API_CACHE_DISK_ENTRIES', 50000))
+API_CACHE_TOUCH_INTERVAL_SECONDS = 3600
+PEXELS_CACHE_TTL_SECONDS = int(os.getenv('PEXELS_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+AI_CACHE_TTL_SECONDS = int(os.getenv('AI_CACHE_TTL_SECONDS', 24 * 3600))
+
+# Read endpoints are cached per (endpoint, args, table versions) and served
+# with ETag/Last-Modified validators
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+TABLE_VERSION_TTL_SECONDS = float(os.getenv('TABLE_VERSION_TTL_SECONDS', 1))
+
 # Free tier limit for user-generated AI posts
 FREE_TIER_AI_POSTS_LIMIT = 3
 
+# Per-user token bucket in front of the AI endpoints (all tiers): refills
+# AI_RATE_LIMIT_PER_MINUTE requests a minute, up to AI_RATE_LIMIT_BURST at
+# once. Kept in memory, so each worker process limits on its own. 0 disables.
+AI_RATE_LIMIT_PER_MINUTE = float(os.getenv('AI_RATE_LIMIT_PER_MINUTE', 6))
+AI_RATE_LIMIT_BURST = int(os.getenv('AI_RATE_LIMIT_BURST', 3))
+AI_RATE_LIMIT_MAX_BUCKETS = 100000
+
+# Manual AI generation runs as background jobs; jobs not finished after
+# AI_JOB_STALE_SECONDS (e.g. their worker process died) are failed on poll
+AI_JOB_WORKERS = int(os.getenv('AI_JOB_WORKERS', 4))
+AI_JOB_STALE_SECONDS = int(os.getenv('AI_JOB_STALE_SECONDS', 300))
+# A scheduled sweep also fails (and refunds) stale jobs nobody polls, and
+# deletes finished jobs after AI_JOB_RETENTION_DAYS
+AI_JOB_SWEEP_INTERVAL_MINUTES = int(os.getenv('AI_JOB_SWEEP_INTERVAL_MINUTES', 5))
+AI_JOB_RETENTION_DAYS = int(os.getenv('AI_JOB_RETENTION_DAYS', 7))
+
+# Post list pagination
+POSTS_PAGE_SIZE = 20
+POSTS_MAX_PAGE_SIZE = 100
+POST_EXCERPT_LENGTH = 200
+
+# View counts are buffered in-process and written back in batches
+VIEW_FLUSH_INTERVAL_SECONDS = float(os.getenv('VIEW_FLUSH_INTERVAL_SECONDS', 5))
+VIEW_FLUSH_THRESHOLD = int(os.getenv('VIEW_FLUSH_THRESHOLD', 1000))
+
+# Aggregate stats are materialized counters; the cache TTL bounds staleness
+# across workers and the recompute job corrects any drift
+STATS_CACHE_TTL_SECONDS = int(os.getenv('STATS_CACHE_TTL_SECONDS', 30))
+STATS_RECOMPUTE_INTERVAL_MINUTES = int(os.getenv('STATS_RECOMPUTE_INTERVAL_MINUTES', 60))
+
+# Trending ranks posts by views with exponential decay; each window is the
+# half-life of a view's weight. Scores live in memory and are merged into
+# the trending_score table every TRENDING_SNAPSHOT_SECONDS.
+TRENDING_WINDOWS = {'1h': 3600, '24h': 24 * 3600, '7d': 7 * 24 * 3600}
+TRENDING_DEFAULT_WINDOW = os.getenv('TRENDING_DEFAULT_WINDOW', '24h')
+TRENDING_DEFAULT_K = 3
+TRENDING_MAX_K = int(os.getenv('TRENDING_MAX_K', 50))
+TRENDING_SNAPSHOT_SECONDS = float(os.getenv('TRENDING_SNAPSHOT_SECONDS', 60))
+TRENDING_MIN_SCORE = float(os.getenv('TRENDING_MIN_SCORE', 0.01))
+
+# Bulk NDJSON import/export, authorized with `Authorization: Bearer <token>`;
+# the endpoints are disabled while BULK_API_TOKEN is unset
+BULK_API_TOKEN = os.getenv('BULK_API_TOKEN')
+BULK_IMPORT_BATCH_SIZE = int(os.getenv('BULK_IMPORT_BATCH_SIZE', 1000))
+BULK_EXPORT_BATCH_SIZE = int(os.getenv('BULK_EXPORT_BATCH_SIZE', 1000))
+
+# Requests slower than this (in seconds) are logged with the SQL they issued;
+# unset disables the log
+SLOW_REQUEST_LOG_SECONDS = float(os.getenv('SLOW_REQUEST_LOG_SECONDS')) if os.getenv('SLOW_REQUEST_LOG_SECONDS') else None
+
 # --- Placeholder for AI User (for scheduled posts) ---
 AI_USER_ID = None
 
 # --------------------- Main Route for Frontend --------------------- #
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
@@ -67,6 +263,11 @@ class User(db.Model):
     password = db.Column(db.String(100), nullable=False)
     is_premium = db.Column(db.Boolean, default=False, nullable=False)
     ai_posts_generated_count = db.Column(db.Integer, default=0, nullable=False)
+    # Materialized counters, maintained by adjust_post_stats(). ai_posts_count
+    # counts the user's AI posts; ai_posts_generated_count above is the quota.
+    posts_count = db.Column(db.Integer, default=0, nullable=False)
+    views_count = db.Column(db.Integer, default=0, nullable=False)
+    ai_posts_count = db.Column(db.Integer, default=0, nullable=False)
     posts = db.relationship('Post', backref='author', lazy=True)
 
 class Post(db.Model):
@@ -78,17 +279,483 @@ class Post(db.Model):
     views = db.Column(db.Integer, default=0, nullable=False)
     is_ai_generated = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # sha256 of title and body; bulk imports upsert on it
+    content_hash = db.Column(db.String(64))
+    # Headline a news post was written from, and the hash of its normalized
+    # form (see headline_hash)
+    source_title = db.Column(db.String(300))
+    source_hash = db.Column(db.String(64))
+    image_asset = db.relationship(
+        'ImageAsset', primaryjoin='foreign(Post.image_url) == ImageAsset.source_url', viewonly=True, uselist=False
+    )
+
+    # One index per listing: the feed, a user's posts, and AI-only posts, each
+    # walked newest first (see paginate_posts)
+    __table_args__ = (
+        db.Index('ix_post_created_at_id', 'created_at', 'id'),
+        db.Index('ix_post_user_id_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_post_is_ai_generated_created_at', 'is_ai_generated', 'created_at', 'id'),
+        db.Index('ix_post_content_hash', 'content_hash'),
+        db.Index('ix_post_source_hash', 'source_hash'),
+    )
+
+def post_content_hash(title, content):
+    return hashlib.sha256(json.dumps([title.strip(), content.strip()]).encode()).hexdigest()
+
+@event.listens_for(Post, 'before_insert')
+@event.listens_for(Post, 'before_update')
+def set_post_content_hash(mapper, connection, post):
+    post.content_hash = post_content_hash(post.title, post.content)
+
+class ImageAsset(db.Model):
+    # Local copy of a remote post image (see ingest_image)
+    id = db.Column(db.Integer, primary_key=True)
+    source_url = db.Column(db.String(300), unique=True, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, ready, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    content_hash = db.Column(db.String(64), index=True)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    variant_widths = db.Column(db.String(100))  # comma-separated, ascending
+    placeholder = db.Column(db.Text)  # data: URI of a tiny preview
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class GenerationJob(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    prompt = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, succeeded, failed
+    quota_reserved = db.Column(db.Boolean, default=False, nullable=False)
+    title = db.Column(db.String(200))
+    content = db.Column(db.Text)
+    image_url = db.Column(db.String(300))
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_generation_job_status_updated_at', 'status', 'updated_at'),
+    )
+
+class TableVersion(db.Model):
+    # Bumped in the same transaction as every write to `name`; cached
+    # responses are keyed on it
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class TrendingScore(db.Model):
+    # log2 of the post's decayed view weight, measured from TRENDING_EPOCH
+    # (see TrendingEngine)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    time_window = db.Column(db.String(10), primary_key=True)
+    is_ai_generated = db.Column(db.Boolean, default=False, nullable=False)
+    log_score = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_trending_score_window_ai_score', 'time_window', 'is_ai_generated', 'log_score'),
+    )
+
+class SchedulerLock(db.Model):
+    # One row per lock; the owner must renew it before expires_at
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class WebhookEvent(db.Model):
+    # One row per FastSpring event id; a redelivered event is recognised here
+    id = db.Column(db.String(100), primary_key=True)
+    type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processed, skipped
+    error = db.Column(db.String(200))
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_webhook_event_status_received', 'status', 'received_at'),
+    )
+
+class SiteStats(db.Model):
+    # Single row (id=1) of site-wide counters
+    id = db.Column(db.Integer, primary_key=True)
+    total_users = db.Column(db.Integer, default=0, nullable=False)
+    total_posts = db.Column(db.Integer, default=0, nullable=False)
+    total_views = db.Column(db.Integer, default=0, nullable=False)
+    total_ai_posts = db.Column(db.Integer, default=0, nullable=False)
+
+# --------------------- Metrics --------------------- #
+
+# Minimal Prometheus instruments, rendered by /metrics in the text exposition
+# format. Values are per process; scrape every worker.
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+metrics_registry = []
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> value
+        metrics_registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.collect().items()):
+            lines.extend(self.render_value(key, value))
+        return lines
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render_value(self, key, value):
+        return [f"{self.name}{format_labels(zip(self.label_names, key))} {format_number(value)}"]
+
+class CounterMetric(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class HistogramMetric(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def collect(self):
+        with self._lock:
+            return {key: (list(counts), list(totals)) for key, (counts, totals) in self._values.items()}
+
+    def render_value(self, key, value):
+        counts, (total, count) = value
+        labels = list(zip(self.label_names, key))
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{format_labels(labels + [('le', format_number(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{format_labels(labels)} {format_number(total)}")
+        lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+# Reads its values from `collect_fn` (label values -> value) at scrape time
+class CallbackMetric(Metric):
+    def __init__(self, name, help_text, kind, collect_fn, labels=()):
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self.collect = collect_fn
+
+def format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    escape = lambda value: value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+def format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+http_requests_total = CounterMetric('http_requests_total', 'HTTP requests by route and status.', ('route', 'method', 'status'))
+http_request_duration = HistogramMetric('http_request_duration_seconds', 'Time to build each response.', ('route', 'method'))
+http_request_sql_queries = HistogramMetric(
+    'http_request_sql_queries', 'SQL statements issued per request.', ('route',), buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+http_request_sql_duration = HistogramMetric('http_request_sql_duration_seconds', 'Time spent in SQL per request.', ('route',))
+db_query_duration = HistogramMetric('db_query_duration_seconds', 'SQL statement latency.', ('statement',))
+upstream_request_duration = HistogramMetric(
+    'upstream_request_duration_seconds', 'Outbound API call latency, including retries.', ('upstream', 'outcome')
+)
+upstream_events_total = CounterMetric('upstream_events_total', 'Outbound API retries and calls rejected by the circuit breaker.', ('upstream', 'event'))
+scheduler_job_duration = HistogramMetric('scheduler_job_duration_seconds', 'Background job run time.', ('job', 'outcome'))
+news_category_outcomes_total = CounterMetric('news_category_outcomes_total', 'News pipeline results per category.', ('category', 'outcome'))
+webhook_events_total = CounterMetric('webhook_events_total', 'FastSpring webhook events by outcome.', ('outcome',))
+ai_requests_limited_total = CounterMetric('ai_requests_limited_total', 'AI generation requests refused.', ('reason',))
+ai_batch_posts_total = CounterMetric(
+    'ai_batch_posts_total', 'Posts from batched completions, or from single-post retries after a batch fell short.', ('source',)
+)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query_metrics(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    db_query_duration.observe(elapsed, statement=verb)
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+        if SLOW_REQUEST_LOG_SECONDS is not None:
+            g.sql_log.append((elapsed, statement))
+
+@bp.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+    g.sql_log = []
+
+@bp.after_app_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    http_requests_total.inc(route=route, method=request.method, status=response.status_code)
+    http_request_duration.observe(elapsed, route=route, method=request.method)
+    http_request_sql_queries.observe(g.sql_queries, route=route)
+    http_request_sql_duration.observe(g.sql_seconds, route=route)
+    if SLOW_REQUEST_LOG_SECONDS is not None and elapsed >= SLOW_REQUEST_LOG_SECONDS:
+        print(f"Slow request: {request.method} {request.full_path.rstrip('?')} took {elapsed * 1000:.1f} ms, "
+              f"{g.sql_queries} queries in {g.sql_seconds * 1000:.1f} ms")
+        for seconds, statement in g.sql_log:
+            print(f"  {seconds * 1000:8.2f} ms  {' '.join(statement.split())}")
+    return response
+
+# Wraps a scheduled job so each run is timed and failures are counted
+def timed_job(name):
+    def decorator(fn):
+        def run(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = fn(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                scheduler_job_duration.observe(time.perf_counter() - started, job=name, outcome=outcome)
+        run.__name__ = fn.__name__
+        return run
+    return decorator
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    lines = []
+    for metric in metrics_registry:
+        lines.extend(metric.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# --------------------- Stats Counters --------------------- #
+
+class TTLCache:
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at, value)
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+        value = loader()
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, value)
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+stats_cache = TTLCache(STATS_CACHE_TTL_SECONDS)
+
+# The adjust_* and bump_* helpers run inside the caller's transaction; call
+# invalidate_read_caches() once it has committed.
+def adjust_site_stats(users=0, posts=0, views=0, ai_posts=0):
+    db.session.execute(
+        db.update(SiteStats).where(SiteStats.id == 1).values(
+            total_users=SiteStats.total_users + users,
+            total_posts=SiteStats.total_posts + posts,
+            total_views=SiteStats.total_views + views,
+            total_ai_posts=SiteStats.total_ai_posts + ai_posts
+        )
+    )
+
+def adjust_post_stats(user_id, posts=0, views=0, ai_posts=0):
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(
+            posts_count=User.posts_count + posts,
+            views_count=User.views_count + views,
+            ai_posts_count=User.ai_posts_count + ai_posts
+        )
+    )
+    adjust_site_stats(posts=posts, views=views, ai_posts=ai_posts)
+
+def invalidate_read_caches():
+    stats_cache.invalidate('global')
+    table_versions.clear()
+
+def load_global_stats():
+    site_stats = db.session.get(SiteStats, 1)
+    if not site_stats:
+        recompute_stats()
+        site_stats = db.session.get(SiteStats, 1)
+    return {
+        'total_users': site_stats.total_users,
+        'total_posts': site_stats.total_posts,
+        'total_views': site_stats.total_views,
+        'total_ai_posts': site_stats.total_ai_posts
+    }
+
+# Drift correction: rebuild every counter from the base tables. Like every
+# scheduled job it runs inside an app context pushed by the caller.
+@timed_job('recompute_stats')
+def recompute_stats():
+    user_posts = Post.query.filter(Post.user_id == User.id)
+    db.session.execute(
+        db.update(User).values(
+            posts_count=user_posts.with_entities(db.func.count(Post.id)).scalar_subquery(),
+            views_count=user_posts.with_entities(db.func.coalesce(db.func.sum(Post.views), 0)).scalar_subquery(),
+            ai_posts_count=user_posts.filter(Post.is_ai_generated.is_(True)).with_entities(db.func.count(Post.id)).scalar_subquery()
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    site_stats = db.session.get(SiteStats, 1) or SiteStats(id=1)
+    site_stats.total_users = User.query.count()
+    site_stats.total_posts = Post.query.count()
+    site_stats.total_views = db.session.query(db.func.sum(Post.views)).scalar() or 0
+    site_stats.total_ai_posts = Post.query.filter_by(is_ai_generated=True).count()
+    db.session.add(site_stats)
+    db.session.commit()
+    stats_cache.clear()
+
+# --------------------- HTTP Response Cache --------------------- #
+
+VERSIONED_TABLES = ('post', 'user')
+
+def bump_table_versions_statement(*names):
+    return (
+        db.update(TableVersion.__table__)
+        .where(TableVersion.__table__.c.name.in_(names))
+        .values(version=TableVersion.__table__.c.version + 1, updated_at=datetime.utcnow())
+    )
+
+def bump_table_versions(*names):
+    db.session.execute(bump_table_versions_statement(*names))
+
+# Other workers see a bump within TABLE_VERSION_TTL_SECONDS; this process
+# sees its own writes immediately via invalidate_read_caches().
+def load_table_versions():
+    rows = {row.name: (row.version, row.updated_at) for row in TableVersion.query.all()}
+    missing = [name for name in VERSIONED_TABLES if name not in rows]
+    if missing:
+        try:
+            db.session.add_all([TableVersion(name=name, version=0) for name in missing])
+            db.session.commit()
+        except db.exc.IntegrityError:
+            db.session.rollback()
+        return load_table_versions()
+    return rows
+
+table_versions = TTLCache(TABLE_VERSION_TTL_SECONDS)
+
+# In-process LRU of serialized responses, bounded by total body size
+class ResponseCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (body, etag, summary)
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key)[0])
+            self._entries[key] = entry
+            self._size += len(entry[0])
+            while self._size > self.max_bytes and self._entries:
+                self._size -= len(self._entries.popitem(last=False)[1][0])
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
+# Serves a public JSON read endpoint from the cache, calling build() only on a
+# miss. Only 200s are cached. Adds a strong ETag and a Last-Modified taken
+# from the newest write to the tables the endpoint depends on, and turns a
+# matching If-None-Match into a 304. If-Modified-Since is not honoured: HTTP
+# dates have whole seconds, so a write in the same second as the previous
+# response would still validate. Returns
+# (response, summary): summary is what summarize(payload) returned when the
+# entry was built, kept small since only the body is counted against the
+# cache size; it is None for non-200s or without summarize.
+def cached_json_response(build, tables=VERSIONED_TABLES, summarize=None):
+    versions = table_versions.get('all', load_table_versions)
+    key = (
+        request.path,
+        tuple(sorted(request.args.items(multi=True))),
+        tuple(versions[name][0] for name in tables)
+    )
+    entry = response_cache.get(key)
+    if not entry:
+        response = current_app.make_response(build())
+        if response.status_code != 200:
+            return response, None
+        body = response.get_data()
+        entry = (body, hashlib.sha256(body).hexdigest()[:32], summarize(json.loads(body)) if summarize else None)
+        response_cache.set(key, entry)
+
+    body, etag, summary = entry
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = max(versions[name][1] for name in tables)
+    response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    environ = dict(request.environ)
+    environ.pop('HTTP_IF_MODIFIED_SINCE', None)
+    return response.make_conditional(environ), summary
 
 # --------------------- Auth Routes --------------------- #
 
-@app.route('/api/signup', methods=['POST'])
+@bp.route('/api/signup', methods=['POST'])
 def signup():
     data = request.json
     if User.query.filter_by(username=data['username']).first():
         return jsonify({'error': 'Username already exists'}), 400
     user = User(username=data['username'], password=data['password'])
     db.session.add(user)
+    adjust_site_stats(users=1)
+    bump_table_versions('user')
     db.session.commit()
+    invalidate_read_caches()
     session['user_id'] = user.id
     return jsonify({
         'id': user.id,
@@ -98,7 +765,7 @@ def signup():
         'free_tier_ai_limit': FREE_TIER_AI_POSTS_LIMIT
     })
 
-@app.route('/api/login', methods=['POST'])
+@bp.route('/api/login', methods=['POST'])
 def login():
     data = request.json
     user = User.query.filter_by(username=data['username'], password=data['password']).first()
@@ -113,12 +780,12 @@ def login():
         'free_tier_ai_limit': FREE_TIER_AI_POSTS_LIMIT
     })
 
-@app.route('/api/logout')
+@bp.route('/api/logout')
 def logout():
     session.clear()
     return jsonify({'message': 'Logged out'})
 
-@app.route('/api/me')
+@bp.route('/api/me')
 def get_current_user():
     user_id = session.get('user_id')
     if not user_id:
@@ -138,31 +805,534 @@ def get_current_user():
         'free_tier_ai_limit': FREE_TIER_AI_POSTS_LIMIT
     })
 
-# --------------------- Post Routes --------------------- #
+# --------------------- Post List Helpers --------------------- #
 
-@app.route('/api/posts', methods=['GET'])
-def get_posts():
-    search_query = request.args.get('query')
-    posts_query = Post.query.order_by(Post.created_at.desc())
-    if search_query:
+HTML_TAG_RE = re.compile(r'<[^>]*>?')
+
+# Every post serializer reads author.username, so list queries must load the
+# author in the same SELECT instead of one lazy load per row.
+def with_authors(posts_query):
+    return posts_query.options(
+        db.joinedload(Post.author).load_only(User.id, User.username),
+        db.joinedload(Post.image_asset)
+    )
+
+def serialize_post(post, content=True, excerpt=None):
+    data = {'id': post.id, 'title': post.title, 'image_url': post.image_url, 'username': post.author.username, 'user_id': post.user_id, 'views': post.views + view_counter.pending_for_post(post.id), 'is_ai_generated': post.is_ai_generated}
+    if content:
+        data['content'] = post.content
+    if excerpt is not None:
+        data['excerpt'] = make_excerpt(excerpt)
+    if post.image_asset and post.image_asset.status == 'ready':
+        data['image'] = serialize_image(post.image_asset)
+    return data
+
+def encode_post_cursor(post):
+    raw = f"{post.created_at.isoformat()}|{post.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_post_cursor(cursor):
+    # Raises ValueError on anything that isn't a cursor we handed out
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    created_at, post_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(post_id)
+
+def make_excerpt(raw_content):
+    text = HTML_TAG_RE.sub('', raw_content or '').strip()
+    if len(text) > POST_EXCERPT_LENGTH:
+        text = text[:POST_EXCERPT_LENGTH].rstrip() + '...'
+    return text
+
+def get_page_args():
+    try:
+        limit = int(request.args.get('limit', POSTS_PAGE_SIZE))
+    except ValueError:
+        limit = POSTS_PAGE_SIZE
+    limit = max(1, min(limit, POSTS_MAX_PAGE_SIZE))
+    full_view = request.args.get('view') == 'full'
+    return limit, full_view
+
+# Summary rows only pull a prefix of the body; tags are stripped afterwards so
+# fetch some slack. Rows come back as (post, excerpt) in both views.
+def project_posts(posts_query, full_view):
+    posts_query = with_authors(posts_query)
+    if full_view:
+        return posts_query.add_columns(db.literal(None).label('excerpt'))
+    return posts_query.options(db.defer(Post.content)).add_columns(
+        db.func.substr(Post.content, 1, POST_EXCERPT_LENGTH * 2).label('excerpt')
+    )
+
+# Keyset pagination over (created_at, id), newest first. Reads `limit`, `cursor`
+# and `view` ('summary' by default, or 'full') from the request args and
+# returns (page, None) or (None, error_response).
+def paginate_posts(posts_query):
+    limit, full_view = get_page_args()
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_post_cursor(cursor)
+        except ValueError:
+            return None, (jsonify({'error': 'Invalid cursor'}), 400)
         posts_query = posts_query.filter(
+            (Post.created_at < cursor_created_at) |
+            ((Post.created_at == cursor_created_at) & (Post.id < cursor_id))
+        )
+
+    posts_query = project_posts(posts_query, full_view).order_by(Post.created_at.desc(), Post.id.desc())
+    rows = posts_query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        'posts': [serialize_post(post, content=full_view, excerpt=excerpt) for post, excerpt in rows],
+        'next_cursor': encode_post_cursor(rows[-1][0]) if has_more else None
+    }, None
+
+# --------------------- Full-Text Search --------------------- #
+
+# SQLite: an external-content FTS5 table over post(title, content), kept in sync
+# by triggers so every write path (routes, scheduler, raw SQL) is covered.
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+    "title, content, content='post', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_ai AFTER INSERT ON post BEGIN "
+    "INSERT INTO post_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_ad AFTER DELETE ON post BEGIN "
+    "INSERT INTO post_fts(post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_au AFTER UPDATE OF title, content ON post BEGIN "
+    "INSERT INTO post_fts(post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO post_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    # Index the rows that were written before the triggers existed
+    "INSERT INTO post_fts(post_fts) VALUES ('rebuild')",
+]
+
+# PostgreSQL: a generated, weighted tsvector column with a GIN index.
+POSTGRES_SEARCH_DDL = [
+    "ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_post_search_vector ON post USING GIN (search_vector)",
+]
+
+# Highlight markers survive tag stripping and are swapped for <mark> afterwards
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+
+SQLITE_SEARCH_SQL = """
+    SELECT post.id AS id,
+           snippet(post_fts, 1, :start, :end, '...', 24) AS snippet
+    FROM post_fts JOIN post ON post.id = post_fts.rowid
+    WHERE post_fts MATCH :match {user_filter}
+    ORDER BY bm25(post_fts, 10.0, 1.0)
+    LIMIT :limit OFFSET :offset
+"""
+
+POSTGRES_SEARCH_SQL = """
+    SELECT ranked.id AS id,
+           ts_headline('english', post.content, ranked.q, :headline_options) AS snippet
+    FROM (
+        SELECT post.id, q, ts_rank_cd(post.search_vector, q) AS rank
+        FROM post, plainto_tsquery('english', :match) q
+        WHERE post.search_vector @@ q {user_filter}
+        ORDER BY rank DESC, post.id DESC
+        LIMIT :limit OFFSET :offset
+    ) ranked JOIN post ON post.id = ranked.id
+    ORDER BY ranked.rank DESC, ranked.id DESC
+"""
+
+def search_backend():
+    name = db.engine.dialect.name
+    return name if name in ('sqlite', 'postgresql') else None
+
+def setup_search_index(conn):
+    backend = search_backend()
+    statements = {'sqlite': SQLITE_SEARCH_DDL, 'postgresql': POSTGRES_SEARCH_DDL}.get(backend, [])
+    for statement in statements:
+        conn.execute(db.text(statement))
+    if not backend:
+        print(f"Full-text search not available for {db.engine.dialect.name}; falling back to ILIKE.", file=sys.stderr)
+
+def fts5_match_expression(search_query):
+    # Quote every term so user input can never be parsed as FTS5 syntax; the
+    # last term is a prefix match so partially typed words still hit.
+    terms = re.findall(r'\w+', search_query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def highlight_snippet(snippet):
+    text = HTML_TAG_RE.sub('', snippet or '').strip()
+    return text.replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+def encode_search_cursor(offset):
+    return base64.urlsafe_b64encode(f"offset|{offset}".encode()).decode()
+
+def decode_search_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    prefix, offset = raw.split('|', 1)
+    if prefix != 'offset':
+        raise ValueError("Not a search cursor")
+    return max(0, int(offset))
+
+# BM25-ranked (SQLite) / ts_rank_cd-ranked (PostgreSQL) search. Relevance order
+# has no stable keyset, so search pages use an offset cursor. Same return
+# contract as paginate_posts.
+def search_posts(search_query, user_id=None):
+    backend = search_backend()
+    if not backend:
+        posts_query = Post.query.filter(
             (Post.title.ilike(f'%{search_query}%')) |
             (Post.content.ilike(f'%{search_query}%'))
         )
-    posts = posts_query.all()
-    return jsonify([
-        {'id': post.id, 'title': post.title, 'content': post.content, 'image_url': post.image_url, 'username': post.author.username, 'user_id': post.user_id, 'views': post.views, 'is_ai_generated': post.is_ai_generated}
-        for post in posts
-    ])
+        if user_id is not None:
+            posts_query = posts_query.filter_by(user_id=user_id)
+        return paginate_posts(posts_query)
+
+    limit, full_view = get_page_args()
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            offset = decode_search_cursor(cursor)
+        except ValueError:
+            return None, (jsonify({'error': 'Invalid cursor'}), 400)
+
+    params = {'limit': limit + 1, 'offset': offset}
+    user_filter = ''
+    if user_id is not None:
+        user_filter = 'AND post.user_id = :user_id'
+        params['user_id'] = user_id
+    if backend == 'sqlite':
+        match = fts5_match_expression(search_query)
+        if not match:
+            return {'posts': [], 'next_cursor': None}, None
+        sql = SQLITE_SEARCH_SQL
+        params.update({'match': match, 'start': SNIPPET_START, 'end': SNIPPET_END})
+    else:
+        sql = POSTGRES_SEARCH_SQL
+        params.update({
+            'match': search_query,
+            'headline_options': f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxFragments=1, MaxWords=30, MinWords=10'
+        })
+
+    hits = db.session.execute(db.text(sql.format(user_filter=user_filter)), params).all()
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+
+    rows = {post.id: (post, excerpt) for post, excerpt in project_posts(Post.query, full_view).filter(Post.id.in_([hit.id for hit in hits])).all()}
+    items = []
+    for hit in hits:
+        if hit.id not in rows:
+            continue
+        post, excerpt = rows[hit.id]
+        item = serialize_post(post, content=full_view, excerpt=excerpt)
+        item['snippet'] = highlight_snippet(hit.snippet)
+        items.append(item)
+
+    return {
+        'posts': items,
+        'next_cursor': encode_search_cursor(offset + limit) if has_more else None
+    }, None
+
+# --------------------- View Counter --------------------- #
+
+# Reading a post must not take SQLite's write lock, so views are accumulated
+# here and applied as one `views = views + n` batch per flush. Pending counts
+# stay visible to readers until the batch that contains them has committed.
+class ViewCounter:
+    def __init__(self, flush_interval, flush_threshold):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.app = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pending = {}  # post_id -> (user_id, count)
+        self._pending_by_user = {}
+        self._pending_total = 0
+
+    def init_app(self, app):
+        self.app = app
+
+    def record(self, post_id, user_id, count=1):
+        with self._lock:
+            _, current = self._pending.get(post_id, (user_id, 0))
+            self._pending[post_id] = (user_id, current + count)
+            self._pending_by_user[user_id] = self._pending_by_user.get(user_id, 0) + count
+            self._pending_total += count
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+                self._thread.start()
+            if self._pending_total >= self.flush_threshold:
+                self._wakeup.set()
+
+    def pending_for_post(self, post_id):
+        with self._lock:
+            return self._pending.get(post_id, (None, 0))[1]
+
+    def pending_for_user(self, user_id):
+        with self._lock:
+            return self._pending_by_user.get(user_id, 0)
+
+    def pending_total(self):
+        with self._lock:
+            return self._pending_total
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = dict(self._pending)
+            if not batch:
+                return 0
+            try:
+                params = [{'post_id': post_id, 'count': count} for post_id, (_, count) in batch.items()]
+                # Counters only move for posts that still exist
+                post_owner = db.select(Post.user_id).where(Post.id == db.bindparam('post_id')).scalar_subquery()
+                post_exists = db.exists().where(Post.id == db.bindparam('post_id'))
+                with self.app.app_context():
+                    with db.engine.begin() as conn:
+                        conn.execute(
+                            db.update(Post.__table__).where(Post.__table__.c.id == db.bindparam('post_id'))
+                            .values(views=Post.__table__.c.views + db.bindparam('count')),
+                            params
+                        )
+                        conn.execute(
+                            db.update(User.__table__).where(User.__table__.c.id == post_owner)
+                            .values(views_count=User.__table__.c.views_count + db.bindparam('count')),
+                            params
+                        )
+                        conn.execute(
+                            db.update(SiteStats.__table__).where(SiteStats.__table__.c.id == 1, post_exists)
+                            .values(total_views=SiteStats.__table__.c.total_views + db.bindparam('count')),
+                            params
+                        )
+                        conn.execute(bump_table_versions_statement('post'))
+                invalidate_read_caches()
+            except Exception as e:
+                # Keep the counts buffered and retry on the next flush
+                print(f"View counter flush failed: {e}")
+                return 0
+            with self._lock:
+                for post_id, (user_id, count) in batch.items():
+                    _, current = self._pending[post_id]
+                    if current == count:
+                        del self._pending[post_id]
+                    else:
+                        self._pending[post_id] = (user_id, current - count)
+                    self._pending_by_user[user_id] -= count
+                    if not self._pending_by_user[user_id]:
+                        del self._pending_by_user[user_id]
+                    self._pending_total -= count
+            return sum(count for _, count in batch.values())
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+view_counter = ViewCounter(VIEW_FLUSH_INTERVAL_SECONDS, VIEW_FLUSH_THRESHOLD)
+atexit.register(view_counter.flush)
+CallbackMetric('view_counter_pending_views', 'Views buffered and not yet written.', 'gauge',
+               lambda: {(): view_counter.pending_total()})
+
+# --------------------- Trending --------------------- #
+
+# A view at time t weighs 2 ** ((t - TRENDING_EPOCH) / window) in its post's
+# score. Every score then decays at the same rate, so the ranking only changes
+# when views arrive and nothing needs rescoring as time passes. Scores are
+# stored as log2 to stay within float range.
+TRENDING_EPOCH = 1704067200  # 2024-01-01T00:00:00Z
+
+def log2_add(a, b):
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+# Each process scores the views it serves and merges them into trending_score
+# on every snapshot, then reloads the global top posts from it. Between
+# snapshots rankings come from that top plus the posts viewed here since.
+class TrendingEngine:
+    def __init__(self, windows, max_k, snapshot_interval):
+        self.windows = windows
+        self.max_k = max_k
+        self.snapshot_interval = snapshot_interval
+        self.app = None
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._thread = None
+        self._loaded = False
+        self._scores = {window: {} for window in windows}  # post_id -> (log_score, is_ai_generated)
+        self._pending = {window: {} for window in windows}  # not merged into the table yet
+
+    def init_app(self, app):
+        self.app = app
+
+    def exponent(self, window, now=None):
+        return ((now or time.time()) - TRENDING_EPOCH) / self.windows[window]
+
+    def record_view(self, post_id, is_ai_generated, count=1):
+        now = time.time()
+        with self._lock:
+            for window in self.windows:
+                weight = self.exponent(window, now) + math.log2(count)
+                for scores in (self._scores[window], self._pending[window]):
+                    current = scores.get(post_id, (None,))[0]
+                    scores[post_id] = (log2_add(current, weight), is_ai_generated)
+            self._start()
+
+    # Returns [(post_id, decayed views)], best first. Until the background
+    # thread has loaded the table this only knows this process's views.
+    def top(self, window, k, ai_only=False):
+        now_exponent = self.exponent(window)
+        with self._lock:
+            self._start()
+            ranked = heapq.nlargest(k, (
+                (score, post_id) for post_id, (score, is_ai_generated) in self._scores[window].items()
+                if is_ai_generated or not ai_only
+            ))
+        return [(post_id, 2 ** (score - now_exponent)) for score, post_id in ranked]
 
-@app.route('/api/posts/<int:post_id>', methods=['GET'])
+    def snapshot(self):
+        with self._snapshot_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {window: {} for window in self.windows}
+            try:
+                with self.app.app_context():
+                    top = self._merge(pending)
+            except Exception as e:
+                # Keep the weights pending and retry on the next snapshot
+                print(f"Trending snapshot failed: {e}")
+                with self._lock:
+                    for window, posts in pending.items():
+                        for post_id, (delta, is_ai_generated) in posts.items():
+                            current = self._pending[window].get(post_id, (None,))[0]
+                            self._pending[window][post_id] = (log2_add(current, delta), is_ai_generated)
+                return False
+            self._install(top)
+            return True
+
+    # Read-only first fill of the top-K from the table
+    def load(self):
+        with self._snapshot_lock:
+            if self._loaded:
+                return True
+            try:
+                with self.app.app_context():
+                    top = self._load_top()
+            except Exception as e:
+                print(f"Loading trending scores failed: {e}")
+                return False
+            self._install(top)
+            return True
+
+    def _install(self, top):
+        with self._lock:
+            # Views not merged into the table yet are not in `top`
+            for window, posts in self._pending.items():
+                for post_id, (delta, is_ai_generated) in posts.items():
+                    current = top[window].get(post_id, (None,))[0]
+                    top[window][post_id] = (log2_add(current, delta), is_ai_generated)
+            self._scores = top
+            self._loaded = True
+
+    def flush(self):
+        if any(self._pending.values()):
+            self.snapshot()
+
+    def _merge(self, pending):
+        now = time.time()
+        for window, posts in pending.items():
+            post_ids = list(posts)
+            for start in range(0, len(post_ids), 500):
+                chunk = post_ids[start:start + 500]
+                # Posts deleted since their views were recorded are dropped
+                existing = set(db.session.scalars(db.select(Post.id).where(Post.id.in_(chunk))))
+                rows = {
+                    row.post_id: row for row in TrendingScore.query.filter(
+                        TrendingScore.time_window == window, TrendingScore.post_id.in_(chunk)
+                    ).with_for_update()
+                }
+                for post_id in chunk:
+                    if post_id not in existing:
+                        continue
+                    delta, is_ai_generated = posts[post_id]
+                    if post_id in rows:
+                        rows[post_id].log_score = log2_add(rows[post_id].log_score, delta)
+                    else:
+                        db.session.add(TrendingScore(
+                            post_id=post_id, time_window=window, is_ai_generated=is_ai_generated, log_score=delta
+                        ))
+            # Forget posts whose decayed views have faded out
+            floor = self.exponent(window, now) + math.log2(TRENDING_MIN_SCORE)
+            TrendingScore.query.filter(
+                TrendingScore.time_window == window, TrendingScore.log_score < floor
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        return self._load_top()
+
+    def _load_top(self):
+        top = {}
+        for window in self.windows:
+            top[window] = {}
+            for ai_only in (True, False):
+                q = db.session.query(TrendingScore.post_id, TrendingScore.log_score, TrendingScore.is_ai_generated) \
+                    .filter(TrendingScore.time_window == window)
+                if ai_only:
+                    q = q.filter(TrendingScore.is_ai_generated.is_(True))
+                for post_id, log_score, is_ai_generated in q.order_by(TrendingScore.log_score.desc()).limit(self.max_k):
+                    top[window][post_id] = (log_score, is_ai_generated)
+        return top
+
+    # Called with self._lock held
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='trending-snapshot', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self.load():
+            time.sleep(self.snapshot_interval)
+        while True:
+            time.sleep(self.snapshot_interval)
+            self.snapshot()
+
+trending = TrendingEngine(TRENDING_WINDOWS, TRENDING_MAX_K, TRENDING_SNAPSHOT_SECONDS)
+atexit.register(trending.flush)
+
+# --------------------- Post Routes --------------------- #
+
+@bp.route('/api/posts', methods=['GET'])
+def get_posts():
+    def build():
+        search_query = request.args.get('query')
+        if search_query:
+            page, error = search_posts(search_query)
+        else:
+            page, error = paginate_posts(Post.query)
+        if error:
+            return error
+        return jsonify(page)
+    return cached_json_response(build)[0]
+
+@bp.route('/api/posts/<int:post_id>', methods=['GET'])
 def get_post(post_id):
-    post = Post.query.get_or_404(post_id)
-    post.views += 1
-    db.session.commit()
-    return jsonify({'id': post.id, 'title': post.title, 'content': post.content, 'image_url': post.image_url, 'username': post.author.username, 'user_id': post.user_id, 'views': post.views, 'is_ai_generated': post.is_ai_generated})
+    def build():
+        post = with_authors(Post.query).filter_by(id=post_id).first_or_404()
+        return jsonify(serialize_post(post))
+    # Cached or not, every read still counts as a view
+    response, viewed = cached_json_response(build, summarize=lambda post: (post['id'], post['user_id'], post['is_ai_generated']))
+    if viewed:
+        post_id, user_id, is_ai_generated = viewed
+        view_counter.record(post_id, user_id)
+        trending.record_view(post_id, is_ai_generated)
+    return response
 
-@app.route('/api/posts', methods=['POST'])
+@bp.route('/api/posts', methods=['POST'])
 def create_post():
     user_id = session.get('user_id')
     if not user_id:
@@ -178,7 +1348,11 @@ def create_post():
         
     post = Post(title=data['title'], content=data['content'], image_url=data.get('image_url'), user_id=user_id, views=0, is_ai_generated=is_ai_generated)
     db.session.add(post)
+    adjust_post_stats(user_id, posts=1, ai_posts=int(bool(is_ai_generated)))
+    bump_table_versions('post')
     db.session.commit()
+    invalidate_read_caches()
+    queue_image_ingest([post.image_url])
 
     # Refresh user to ensure we send back the latest state
     db.session.refresh(user)
@@ -196,36 +1370,34 @@ def create_post():
     })
 
 
-@app.route('/api/me/posts', methods=['GET'])
+@bp.route('/api/me/posts', methods=['GET'])
 def get_my_posts():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    my_posts = Post.query.filter_by(user_id=user_id).order_by(Post.created_at.desc()).all()
-    return jsonify([
-        {'id': post.id, 'title': post.title, 'content': post.content, 'image_url': post.image_url, 'username': post.author.username, 'user_id': post.user_id, 'views': post.views, 'is_ai_generated': post.is_ai_generated}
-        for post in my_posts
-    ])
+    page, error = paginate_posts(Post.query.filter_by(user_id=user_id))
+    if error:
+        return error
+    return jsonify(page)
 
-@app.route('/api/users/<int:user_id>/posts', methods=['GET'])
+@bp.route('/api/users/<int:user_id>/posts', methods=['GET'])
 def get_posts_by_user(user_id):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    search_query = request.args.get('query')
-    posts_query = Post.query.filter_by(user_id=user_id).order_by(Post.created_at.desc())
-    if search_query:
-        posts_query = posts_query.filter(
-            (Post.title.ilike(f'%{search_query}%')) |
-            (Post.content.ilike(f'%{search_query}%'))
-        )
-    user_posts = posts_query.all()
-    return jsonify([
-        {'id': post.id, 'title': post.title, 'content': post.content, 'image_url': post.image_url, 'username': user.username, 'user_id': post.user_id, 'views': post.views, 'is_ai_generated': post.is_ai_generated}
-        for post in user_posts
-    ])
+    def build():
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        search_query = request.args.get('query')
+        if search_query:
+            page, error = search_posts(search_query, user_id=user_id)
+        else:
+            page, error = paginate_posts(Post.query.filter_by(user_id=user_id))
+        if error:
+            return error
+        page['username'] = user.username
+        return jsonify(page)
+    return cached_json_response(build)[0]
 
-@app.route('/api/posts/<int:post_id>', methods=['PUT'])
+@bp.route('/api/posts/<int:post_id>', methods=['PUT'])
 def update_post(post_id):
     user_id = session.get('user_id')
     if not user_id:
@@ -237,10 +1409,13 @@ def update_post(post_id):
     post.title = data.get('title', post.title)
     post.content = data.get('content', post.content)
     post.image_url = data.get('image_url', post.image_url)
+    bump_table_versions('post')
     db.session.commit()
+    invalidate_read_caches()
+    queue_image_ingest([post.image_url])
     return jsonify({'message': 'Post updated successfully', 'id': post.id})
 
-@app.route('/api/posts/<int:post_id>', methods=['DELETE'])
+@bp.route('/api/posts/<int:post_id>', methods=['DELETE'])
 def delete_post(post_id):
     user_id = session.get('user_id')
     if not user_id:
@@ -248,182 +1423,1446 @@ def delete_post(post_id):
     post = Post.query.get_or_404(post_id)
     if post.user_id != user_id:
         return jsonify({'error': 'Forbidden: You do not own this post'}), 403
+    TrendingScore.query.filter_by(post_id=post.id).delete()
     db.session.delete(post)
+    adjust_post_stats(user_id, posts=-1, views=-post.views, ai_posts=-int(post.is_ai_generated))
+    bump_table_versions('post')
     db.session.commit()
+    invalidate_read_caches()
     return jsonify({'message': 'Post deleted successfully', 'id': post.id})
 
-@app.route('/api/trending_ai_posts', methods=['GET'])
+@bp.route('/api/trending_ai_posts', methods=['GET'])
 def get_trending_ai_posts():
-    ai_posts = Post.query.filter_by(is_ai_generated=True).order_by(Post.created_at.desc()).limit(3).all()
-    if not ai_posts:
-        ai_posts = Post.query.order_by(Post.created_at.desc()).limit(3).all()
-    return jsonify([
-        {'id': post.id, 'title': post.title, 'content': post.content, 'image_url': post.image_url, 'username': post.author.username, 'user_id': post.user_id, 'views': post.views, 'is_ai_generated': post.is_ai_generated}
-        for post in ai_posts
-    ])
+    window = request.args.get('window', TRENDING_DEFAULT_WINDOW)
+    if window not in TRENDING_WINDOWS:
+        return jsonify({'error': f"window must be one of: {', '.join(TRENDING_WINDOWS)}"}), 400
+    try:
+        k = int(request.args.get('k', TRENDING_DEFAULT_K))
+    except ValueError:
+        k = TRENDING_DEFAULT_K
+    k = max(1, min(k, TRENDING_MAX_K))
 
-# --------------------- AI Generation & News Fetching Logic --------------------- #
+    def build():
+        ranked = trending.top(window, k, ai_only=True)
+        posts = {post.id: post for post in with_authors(Post.query).filter(Post.id.in_([post_id for post_id, _ in ranked]))}
+        items = []
+        for post_id, score in ranked:
+            if post_id in posts:
+                items.append(dict(serialize_post(posts[post_id]), trending_score=round(score, 3)))
+        # Until enough posts have been viewed, fill up with the newest AI posts
+        if len(items) < k:
+            fill = with_authors(Post.query).filter_by(is_ai_generated=True) \
+                .filter(Post.id.notin_([item['id'] for item in items])) \
+                .order_by(Post.created_at.desc()).limit(k - len(items)).all()
+            if not fill and not items:
+                fill = with_authors(Post.query).order_by(Post.created_at.desc()).limit(k).all()
+            items.extend(dict(serialize_post(post), trending_score=0) for post in fill)
+        return jsonify(items)
+    return cached_json_response(build, tables=('post',))[0]
 
-def generate_ai_content(prompt):
-    if not openai_client:
-        return None, None, "OpenAI API key is not configured."
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful blog post assistant. Generate a blog post title and content based on the user's prompt. Provide the output in a JSON format with 'title' and 'content' keys. Keep the content detailed and suitable for a general audience. The content should be at least 200 words."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            max_tokens=1500
+# --------------------- Bulk Import/Export --------------------- #
+
+def bulk_api_authorized():
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return bool(BULK_API_TOKEN) and hmac.compare_digest(token, BULK_API_TOKEN)
+
+# Yields every post after `since_id` as a dict, oldest first. Rows are
+# streamed from a server-side cursor in BULK_EXPORT_BATCH_SIZE chunks, so
+# memory stays flat however many posts there are.
+def export_posts(since_id=0):
+    post = Post.__table__
+    rows = db.session.execute(
+        db.select(
+            post.c.id, post.c.title, post.c.content, post.c.image_url, post.c.views,
+            post.c.is_ai_generated, post.c.created_at, post.c.content_hash, User.__table__.c.username
         )
-        ai_output = response.choices[0].message.content
+        .join(User.__table__, User.__table__.c.id == post.c.user_id)
+        .where(post.c.id > since_id)
+        .order_by(post.c.id)
+        .execution_options(yield_per=BULK_EXPORT_BATCH_SIZE)
+    )
+    for row in rows:
+        yield {
+            'id': row.id,
+            'title': row.title,
+            'content': row.content,
+            'image_url': row.image_url,
+            'username': row.username,
+            'views': row.views,
+            'is_ai_generated': row.is_ai_generated,
+            'created_at': row.created_at.isoformat(),
+            'content_hash': row.content_hash
+        }
+
+# Largest value every backend's Integer column holds
+MAX_POST_VIEWS = 2 ** 31 - 1
+
+# Raises ValueError, TypeError, KeyError or OverflowError for a bad record
+def parse_import_record(record, user_ids, default_user_id):
+    title, content = record.get('title'), record.get('content')
+    if not isinstance(title, str) or not isinstance(content, str) or not title.strip() or not content.strip():
+        raise ValueError('title and content are required')
+    title = title[:200]
+    username, image_url = record.get('username'), record.get('image_url')
+    if username is not None and not isinstance(username, str):
+        raise ValueError('username must be a string')
+    if image_url is not None and (not isinstance(image_url, str) or len(image_url) > 300):
+        raise ValueError('image_url must be a string of at most 300 characters')
+    views = record.get('views') or 0
+    if isinstance(views, bool) or not isinstance(views, (int, float, str)):
+        raise ValueError('views must be a non-negative integer')
+    views = int(views)  # OverflowError for Infinity
+    if not 0 <= views <= MAX_POST_VIEWS:
+        raise ValueError('views must be a non-negative integer')
+    created_at = datetime.fromisoformat(record['created_at']) if record.get('created_at') else datetime.utcnow()
+    if created_at.tzinfo:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return {
+        'title': title,
+        'content': content,
+        'image_url': image_url,
+        'user_id': user_ids.get(username, default_user_id),
+        'views': views,
+        'is_ai_generated': bool(record.get('is_ai_generated', False)),
+        'created_at': created_at,
+        'content_hash': post_content_hash(title, content)
+    }
+
+# Reads NDJSON posts from `lines` and writes them in one transaction per
+# batch. Posts whose title and body are already stored (by content hash) only
+# get their image_url updated, so re-running an import is harmless. Authors
+# are matched by username, falling back to `default_user_id`. Yields running
+# totals after every batch.
+def import_posts(lines, default_user_id, batch_size=BULK_IMPORT_BATCH_SIZE):
+    totals = {'processed': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+    error_samples = []
+    batch = []  # (line number, decoded record)
+
+    def record_error(line_number, error):
+        totals['errors'] += 1
+        if len(error_samples) < 20:
+            error_samples.append({'line': line_number, 'error': str(error)})
+
+    def write_batch():
+        usernames = {record.get('username') for _, record in batch if isinstance(record.get('username'), str)}
+        user_ids = dict(db.session.query(User.username, User.id).filter(User.username.in_(usernames))) if usernames else {}
+        mappings = {}
+        valid = 0
+        for line_number, record in batch:
+            try:
+                mapping = parse_import_record(record, user_ids, default_user_id)
+            except (ValueError, TypeError, KeyError, OverflowError) as e:
+                record_error(line_number, e)
+                continue
+            valid += 1
+            mappings.setdefault(mapping['content_hash'], mapping)
+        batch.clear()
+
+        existing = {
+            row.content_hash: row for row in
+            db.session.query(Post.id, Post.content_hash, Post.image_url).filter(Post.content_hash.in_(list(mappings)))
+        }
+        inserts = [mapping for content_hash, mapping in mappings.items() if content_hash not in existing]
+        updates = [
+            {'id': existing[content_hash].id, 'image_url': mapping['image_url']}
+            for content_hash, mapping in mappings.items()
+            if content_hash in existing and mapping['image_url'] and mapping['image_url'] != existing[content_hash].image_url
+        ]
+        if inserts:
+            db.session.bulk_insert_mappings(Post, inserts)
+            per_user = {}
+            for mapping in inserts:
+                posts, views, ai_posts = per_user.get(mapping['user_id'], (0, 0, 0))
+                per_user[mapping['user_id']] = (posts + 1, views + mapping['views'], ai_posts + int(mapping['is_ai_generated']))
+            for user_id, (posts, views, ai_posts) in per_user.items():
+                adjust_post_stats(user_id, posts=posts, views=views, ai_posts=ai_posts)
+        if updates:
+            db.session.bulk_update_mappings(Post, updates)
+        if inserts or updates:
+            bump_table_versions('post')
+        db.session.commit()
+        if inserts or updates:
+            invalidate_read_caches()
+            queue_image_ingest([mapping['image_url'] for mapping in inserts + updates])
+        totals['inserted'] += len(inserts)
+        totals['updated'] += len(updates)
+        totals['unchanged'] += valid - len(inserts) - len(updates)
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        totals['processed'] += 1
         try:
-            parsed_output = json.loads(ai_output)
-            return parsed_output.get('title'), parsed_output.get('content'), None
-        except json.JSONDecodeError:
-            print(f"Error decoding AI response: {ai_output}")
-            return None, None, "Failed to parse AI response."
-    except openai.APIError as e:
-        print(f"OpenAI API error: {e}")
-        return None, None, f"OpenAI API error: {e}"
-    except Exception as e:
-        print(f"An unexpected error occurred during AI generation: {e}")
-        return None, None, f"An unexpected error occurred: {e}"
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('expected a JSON object')
+        except ValueError as e:
+            record_error(line_number, e)
+            continue
+        batch.append((line_number, record))
+        if len(batch) >= batch_size:
+            write_batch()
+            yield dict(totals)
+    if batch:
+        write_batch()
+    yield dict(totals, done=True, error_samples=error_samples)
 
-def search_pexels_image(query):
-    if not PEXELS_API_KEY:
-        return None
+@bp.route('/api/posts/export', methods=['GET'])
+def export_posts_ndjson():
+    if not bulk_api_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
     try:
-        headers = {'Authorization': PEXELS_API_KEY}
-        params = {'query': query, 'per_page': 1, 'orientation': 'landscape'}
-        response = requests.get('https://api.pexels.com/v1/search', headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if data and data['photos']:
-            return data['photos'][0]['src']['large']
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"Pexels API request failed: {e}")
-        return None
-    except Exception as e:
-        print(f"An error occurred during Pexels image search: {e}")
-        return None
+        since_id = int(request.args.get('since_id', 0))
+    except ValueError:
+        return jsonify({'error': 'since_id must be an integer'}), 400
+    lines = (json.dumps(post) + '\n' for post in export_posts(since_id))
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
 
-@app.route('/api/generate_ai_post', methods=['POST'])
-def generate_ai_post_manual():
-    user_id = session.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'Unauthorized'}), 401
+# Streams the running totals back as NDJSON, one line per committed batch
+@bp.route('/api/posts/import', methods=['POST'])
+def import_posts_ndjson():
+    if not bulk_api_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    default_username = request.args.get('default_username', 'ai_writer')
+    default_user = User.query.filter_by(username=default_username).first()
+    if not default_user:
+        return jsonify({'error': f"Unknown default_username '{default_username}'"}), 400
+    progress = import_posts(request.stream, default_user.id)
+    return Response(stream_with_context(json.dumps(totals) + '\n' for totals in progress), mimetype='application/x-ndjson')
 
-    data = request.json
-    prompt = data.get('prompt')
-    if not prompt:
-        return jsonify({'error': 'Prompt is required'}), 400
+@bp.cli.command('export-posts')
+@click.argument('output', type=click.File('w'), default='-')
+@click.option('--since-id', type=int, default=0, help='Only export posts with a larger id.')
+def export_posts_command(output, since_id):
+    count = 0
+    # `output` may be the real stdout; anything print()ed meanwhile (e.g. by a
+    # background flush) goes to stderr instead of into the NDJSON
+    with contextlib.redirect_stdout(sys.stderr):
+        for post in export_posts(since_id):
+            output.write(json.dumps(post) + '\n')
+            count += 1
+    click.echo(f"Exported {count} posts.", err=True)
 
-    user = User.query.get(user_id)
-    db.session.refresh(user)
-    
-    if not user.is_premium and user.ai_posts_generated_count >= FREE_TIER_AI_POSTS_LIMIT:
-        print(f"[DEBUG - generate_ai_post_manual] FREE TIER LIMIT HIT for {user.username}! Blocking generation.")
-        return jsonify({'error': f'Free tier limit reached ({FREE_TIER_AI_POSTS_LIMIT} AI posts). Upgrade to premium for unlimited AI post generation.'}), 403
+@bp.cli.command('import-posts')
+@click.argument('source', type=click.File('rb'))
+@click.option('--default-username', default='ai_writer', help='Author for records whose username does not exist.')
+@click.option('--batch-size', type=int, default=BULK_IMPORT_BATCH_SIZE)
+def import_posts_command(source, default_username, batch_size):
+    default_user = User.query.filter_by(username=default_username).first()
+    if not default_user:
+        raise click.ClickException(f"Unknown user '{default_username}'")
+    for totals in import_posts(source, default_user.id, batch_size):
+        click.echo(
+            f"{totals['processed']} processed: {totals['inserted']} inserted, {totals['updated']} updated, "
+            f"{totals['unchanged']} unchanged, {totals['errors']} errors"
+        )
+    for sample in totals['error_samples']:
+        click.echo(f"  line {sample['line']}: {sample['error']}", err=True)
 
-    title, content, ai_error = generate_ai_content(prompt)
-    if ai_error:
-        return jsonify({'error': ai_error}), 500
-    if not title or not content:
-        return jsonify({'error': 'Failed to generate content from AI. Please try a different prompt.'}), 500
+# --------------------- Outbound HTTP --------------------- #
 
-    if not user.is_premium:
-        user.ai_posts_generated_count += 1
-        db.session.add(user)
-        db.session.commit()
-        print(f"[DEBUG - generate_ai_post_manual] User '{user.username}' count incremented to {user.ai_posts_generated_count} and committed.")
+class UpstreamUnavailable(Exception):
+    pass
 
-    image_url = search_pexels_image(title.split(':')[0].strip())
+# Opens after `failure_threshold` consecutive failures and rejects calls for
+# `reset_seconds`; then lets a single trial call through (half-open), whose
+# outcome closes or re-opens it.
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
 
-    return jsonify({
-        'title': title,
-        'content': content,
-        'image_url': image_url
-    })
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+            if self.state == 'open':
+                return False
+            if self.state == 'half_open':
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
 
-def fetch_news_and_generate_posts():
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+class Upstream:
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, name):
+        self.name = name
+        self.breaker = CircuitBreaker(CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_RESET_SECONDS)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=OUTBOUND_POOL_SIZE, pool_maxsize=OUTBOUND_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'errors': 0, 'retries': 0, 'rejected': 0, 'latency_seconds_total': 0.0, 'latency_seconds_max': 0.0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+        upstream_events_total.inc(amount, upstream=self.name, event=name)
+
+    def _record_latency(self, started, failed):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.counters['calls'] += 1
+            self.counters['errors'] += int(failed)
+            self.counters['latency_seconds_total'] += elapsed
+            self.counters['latency_seconds_max'] = max(self.counters['latency_seconds_max'], elapsed)
+        upstream_request_duration.observe(elapsed, upstream=self.name, outcome='error' if failed else 'ok')
+
+    # Breaker and counters around any upstream call (the OpenAI SDK does its own HTTP)
+    def call(self, fn):
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise UpstreamUnavailable(f"{self.name} is temporarily unavailable (circuit open)")
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception:
+            self._record_latency(started, failed=True)
+            self.breaker.record_failure()
+            raise
+        self._record_latency(started, failed=False)
+        self.breaker.record_success()
+        return result
+
+    def backoff_seconds(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, OUTBOUND_BACKOFF_MAX_SECONDS)
+        return random.uniform(0, min(OUTBOUND_BACKOFF_MAX_SECONDS, OUTBOUND_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    # Returns the response for any non-retryable status (callers decide about
+    # 4xx); connection errors, timeouts and exhausted 429/5xx retries raise and
+    # count against the breaker. `timeout` caps the read timeout and the total
+    # time spent retrying.
+    def request(self, method, url, timeout=None, **kwargs):
+        read_timeout = min(timeout, OUTBOUND_READ_TIMEOUT_SECONDS) if timeout else OUTBOUND_READ_TIMEOUT_SECONDS
+        deadline = time.monotonic() + timeout if timeout else None
+
+        def send():
+            for attempt in range(OUTBOUND_MAX_RETRIES + 1):
+                retry_after = None
+                try:
+                    response = self.session.request(method, url, timeout=(OUTBOUND_CONNECT_TIMEOUT_SECONDS, read_timeout), **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if attempt == OUTBOUND_MAX_RETRIES:
+                        raise
+                else:
+                    if response.status_code not in self.RETRY_STATUSES:
+                        return response
+                    if attempt == OUTBOUND_MAX_RETRIES:
+                        response.raise_for_status()
+                    header = response.headers.get('Retry-After', '')
+                    retry_after = float(header) if header.isdigit() else None
+                delay = self.backoff_seconds(attempt, retry_after)
+                if deadline and time.monotonic() + delay >= deadline:
+                    raise requests.exceptions.Timeout(f"{self.name}: no time left to retry")
+                self._count('retries')
+                time.sleep(delay)
+
+        return self.call(send)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, circuit=self.breaker.state)
+
+upstreams = {name: Upstream(name) for name in ('openai', 'pexels', 'newsapi', 'images')}
+CallbackMetric('upstream_circuit_open', 'Whether the circuit breaker is rejecting calls.', 'gauge',
+               lambda: {(name,): int(upstream.breaker.state == 'open') for name, upstream in upstreams.items()}, ('upstream',))
+
+@bp.route('/api/upstreams', methods=['GET'])
+def get_upstream_stats():
+    return jsonify({name: upstream.stats() for name, upstream in upstreams.items()})
+
+# --------------------- API Response Cache --------------------- #
+
+# Content-addressed cache for paid upstream calls: an LRU dict in front of a
+# SQLite table. Entries expire after their TTL; the disk table is trimmed to
+# the least recently used `disk_entries` rows.
+class APICache:
+    def __init__(self, path, memory_entries, disk_entries):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        # Guards the memory LRU and counters only; disk I/O happens outside it
+        # on a connection per thread
+        self._lock = threading.Lock()
+        self._trim_lock = threading.Lock()
+        self._local = threading.local()
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._disk_rows = None
+        self._disk_rows_pid = None
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+    # Defaults the cache file to the app's instance folder
+    def init_app(self, app):
+        self.path = self.path or os.path.join(app.instance_path, 'api_cache.db')
+
+    @staticmethod
+    def key(namespace, *parts):
+        normalized = [' '.join(str(part).split()).casefold() for part in parts]
+        return hashlib.sha256(json.dumps([namespace] + normalized).encode()).hexdigest()
+
+    def _connection(self):
+        # One connection per thread; a forked worker must not reuse its parent's
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_api_cache_accessed_at ON api_cache (accessed_at)")
+            conn.commit()
+            self._local.conn, self._local.pid = conn, os.getpid()
+            if self._disk_rows_pid != os.getpid():
+                rows = conn.execute("SELECT COUNT(*) FROM api_cache").fetchone()[0]
+                with self._lock:
+                    self._disk_rows, self._disk_rows_pid = rows, os.getpid()
+        return conn
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return entry[1]
+            self._memory.pop(key, None)
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT value, expires_at, accessed_at FROM api_cache WHERE key = ?", (key,)).fetchone()
+            if row and row[1] > now:
+                # Eviction order only needs coarse recency; skip the write
+                # for rows touched recently
+                if now - row[2] > API_CACHE_TOUCH_INTERVAL_SECONDS:
+                    conn.execute("UPDATE api_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                value = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, row[1], value)
+                    self.counters['disk_hits'] += 1
+                return value
+        except sqlite3.Error as e:
+            print(f"API cache read failed: {e}")
+        with self._lock:
+            self.counters['misses'] += 1
+        return None
+
+    def set(self, key, value, ttl_seconds):
+        now = time.time()
+        expires_at = now + ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self.counters['sets'] += 1
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO api_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            conn.commit()
+            with self._lock:
+                self._disk_rows += 1
+                over_limit = self._disk_rows > self.disk_entries * 1.1
+            # Trim in batches so a full cache doesn't pay for a DELETE on every
+            # set; one thread at a time
+            if over_limit and self._trim_lock.acquire(blocking=False):
+                try:
+                    self._trim(conn, now)
+                finally:
+                    self._trim_lock.release()
+        except sqlite3.Error as e:
+            print(f"API cache write failed: {e}")
+
+    def _trim(self, conn, now):
+        conn.execute("DELETE FROM api_cache WHERE expires_at <= ?", (now,))
+        excess = conn.execute("SELECT COUNT(*) FROM api_cache").fetchone()[0] - self.disk_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM api_cache WHERE key IN (SELECT key FROM api_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+        rows = conn.execute("SELECT COUNT(*) FROM api_cache").fetchone()[0]
+        conn.commit()
+        with self._lock:
+            self._disk_rows = rows
+            self.counters['evictions'] += max(excess, 0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, memory_entries=len(self._memory))
+
+api_cache = APICache(
+    API_CACHE_PATH,
+    API_CACHE_MEMORY_ENTRIES,
+    API_CACHE_DISK_ENTRIES
+)
+CallbackMetric('api_cache_events_total', 'Outbound API cache lookups and writes.', 'counter',
+               lambda: {(event,): count for event, count in api_cache.stats().items() if event != 'memory_entries'}, ('event',))
+
+# --------------------- Image Pipeline --------------------- #
+
+# Posts keep the remote image_url they were created with; its ImageAsset
+# (matched on the URL) holds the local WebP variants once a worker has
+# downloaded and resized it. Identical images share files by content hash.
+image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image-ingest')
+
+def should_ingest_image(url):
+    if not url:
+        return False
+    parts = urlsplit(url)
+    return parts.scheme in ('http', 'https') and ('*' in IMAGE_INGEST_HOSTS or (parts.hostname or '') in IMAGE_INGEST_HOSTS)
+
+# Call after the posts referencing `image_urls` have committed
+def queue_image_ingest(image_urls):
+    if Image is None:
+        return
+    urls = sorted({url for url in image_urls if should_ingest_image(url)})
+    if urls:
+        image_executor.submit(ingest_images, current_app._get_current_object(), urls)
+
+def ingest_images(app, urls):
+    with app.app_context():
+        for url in urls:
+            try:
+                ingest_image(url)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Image ingest failed for {url}: {e}")
+
+def ingest_image(url):
+    asset = ImageAsset.query.filter_by(source_url=url).first()
+    if not asset:
+        try:
+            db.session.add(ImageAsset(source_url=url))
+            db.session.commit()
+        except db.exc.IntegrityError:
+            db.session.rollback()
+        asset = ImageAsset.query.filter_by(source_url=url).first()
+
+    # Claim it, unless another worker already has (or it keeps failing)
+    stale = datetime.utcnow() - timedelta(seconds=IMAGE_STALE_SECONDS)
+    claimed = db.session.execute(
+        db.update(ImageAsset)
+        .where(
+            ImageAsset.id == asset.id,
+            ImageAsset.attempts < IMAGE_MAX_ATTEMPTS,
+            db.or_(
+                ImageAsset.status.in_(('pending', 'failed')),
+                db.and_(ImageAsset.status == 'processing', ImageAsset.updated_at < stale)
+            )
+        )
+        .values(status='processing', attempts=ImageAsset.attempts + 1, updated_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return
+
+    try:
+        fields = store_image_variants(download_image(url))
+    except Exception as e:
+        db.session.execute(
+            db.update(ImageAsset).where(ImageAsset.id == asset.id)
+            .values(status='failed', error=str(e)[:500], updated_at=datetime.utcnow())
+        )
+        db.session.commit()
+        print(f"Image ingest failed for {url}: {e}")
+        return
+    db.session.execute(
+        db.update(ImageAsset).where(ImageAsset.id == asset.id)
+        .values(status='ready', error=None, updated_at=datetime.utcnow(), **fields)
+    )
+    bump_table_versions('post')
+    db.session.commit()
+    invalidate_read_caches()
+
+def download_image(url):
+    response = upstreams['images'].get(url, stream=True)
+    try:
+        response.raise_for_status()
+        chunks, size = [], 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > IMAGE_MAX_BYTES:
+                raise ValueError(f"image is larger than {IMAGE_MAX_BYTES} bytes")
+            chunks.append(chunk)
+        return b''.join(chunks)
+    finally:
+        response.close()
+
+def image_directory(content_hash):
+    return os.path.join(IMAGE_UPLOAD_DIR, content_hash[:2], content_hash)
+
+def store_image_variants(data):
+    content_hash = hashlib.sha256(data).hexdigest()
+    done = ImageAsset.query.filter_by(content_hash=content_hash, status='ready').first()
+    if done and os.path.isdir(image_directory(content_hash)):
+        return {column: getattr(done, column) for column in ('content_hash', 'width', 'height', 'variant_widths', 'placeholder')}
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    width, height = image.size
+    widths = sorted({w for w in IMAGE_VARIANT_WIDTHS if w < width} | {min(width, IMAGE_VARIANT_WIDTHS[-1])})
+    directory = image_directory(content_hash)
+    os.makedirs(directory, exist_ok=True)
+    for variant_width in widths:
+        variant = image if variant_width == width else image.resize(
+            (variant_width, max(1, round(height * variant_width / width))), Image.Resampling.LANCZOS
+        )
+        path = os.path.join(directory, f"{variant_width}.webp")
+        # Write then rename, so readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        variant.save(temp_path, 'WEBP', quality=IMAGE_WEBP_QUALITY, method=4)
+        os.replace(temp_path, path)
+
+    preview = image.copy()
+    preview.thumbnail((16, 16))
+    buffer = io.BytesIO()
+    preview.save(buffer, 'WEBP', quality=40)
+    return {
+        'content_hash': content_hash,
+        'width': width,
+        'height': height,
+        'variant_widths': ','.join(str(w) for w in widths),
+        'placeholder': 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode()
+    }
+
+def serialize_image(asset):
+    base_url = f"{IMAGE_UPLOAD_URL}/{asset.content_hash[:2]}/{asset.content_hash}"
+    widths = [int(w) for w in asset.variant_widths.split(',')]
+    default_width = next((w for w in widths if w >= IMAGE_DEFAULT_WIDTH), widths[-1])
+    return {
+        'src': f"{base_url}/{default_width}.webp",
+        'srcset': ', '.join(f"{base_url}/{w}.webp {w}w" for w in widths),
+        'width': asset.width,
+        'height': asset.height,
+        'placeholder': asset.placeholder
+    }
+
+# Picks up images nobody queued (older posts, crashed workers, retries)
+@timed_job('ingest_missing_images')
+def ingest_missing_images():
+    if Image is None:
+        return
+    stale = datetime.utcnow() - timedelta(seconds=IMAGE_STALE_SECONDS)
+    hosts = ['%'] if '*' in IMAGE_INGEST_HOSTS else sorted(IMAGE_INGEST_HOSTS)
+    urls = db.session.query(Post.image_url).outerjoin(ImageAsset, ImageAsset.source_url == Post.image_url).filter(
+        db.or_(*[
+            Post.image_url.like(f"{scheme}://{host}{separator}%")
+            for host in hosts for scheme in ('http', 'https') for separator in ('/', ':')
+        ]),
+        db.or_(
+            ImageAsset.id.is_(None),
+            db.and_(
+                ImageAsset.attempts < IMAGE_MAX_ATTEMPTS,
+                db.or_(
+                    ImageAsset.status.in_(('pending', 'failed')),
+                    db.and_(ImageAsset.status == 'processing', ImageAsset.updated_at < stale)
+                )
+            )
+        )
+    ).distinct().limit(IMAGE_BACKFILL_BATCH_SIZE)
+    queue_image_ingest([url for (url,) in urls])
+
+# --------------------- AI Generation & News Fetching Logic --------------------- #
+
+AI_POST_MODEL = "gpt-3.5-turbo"
+AI_POST_SYSTEM_PROMPT = "You are a helpful blog post assistant. Generate a blog post title and content based on the user's prompt. Provide the output in a JSON format with 'title' and 'content' keys. Keep the content detailed and suitable for a general audience. The content should be at least 200 words."
+
+def ai_post_completion_args(prompt):
+    return {
+        'model': AI_POST_MODEL,
+        'messages': [
+            {"role": "system", "content": AI_POST_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        'response_format': {"type": "json_object"},
+        'max_tokens': 1500
+    }
+
+def ai_post_cache_key(prompt):
+    return APICache.key('openai', AI_POST_MODEL, AI_POST_SYSTEM_PROMPT, prompt)
+
+# With a timeout the SDK must not retry: each retry would get the full timeout
+# again, and the caller's deadline would stretch to (1 + max_retries) times it
+def deadline_openai_client(timeout):
+    return openai_client.with_options(timeout=timeout, max_retries=0) if timeout else openai_client
+
+def generate_ai_content(prompt, timeout=None):
+    if not openai_client:
+        return None, None, "OpenAI API key is not configured."
+    cache_key = ai_post_cache_key(prompt)
+    cached = api_cache.get(cache_key)
+    if cached:
+        return cached['title'], cached['content'], None
+    try:
+        client = deadline_openai_client(timeout)
+        response = upstreams['openai'].call(lambda: client.chat.completions.create(**ai_post_completion_args(prompt)))
+        ai_output = response.choices[0].message.content
+        try:
+            parsed_output = json.loads(ai_output)
+            title, content = parsed_output.get('title'), parsed_output.get('content')
+            if title and content:
+                api_cache.set(cache_key, {'title': title, 'content': content}, AI_CACHE_TTL_SECONDS)
+            return title, content, None
+        except json.JSONDecodeError:
+            print(f"Error decoding AI response: {ai_output}")
+            return None, None, "Failed to parse AI response."
+    except openai.APIError as e:
+        print(f"OpenAI API error: {e}")
+        return None, None, f"OpenAI API error: {e}"
+    except UpstreamUnavailable as e:
+        print(e)
+        return None, None, str(e)
+    except Exception as e:
+        print(f"An unexpected error occurred during AI generation: {e}")
+        return None, None, f"An unexpected error occurred: {e}"
+
+AI_BATCH_SYSTEM_PROMPT = "You are a helpful blog post assistant. You will receive several numbered requests, each asking for one blog post. Respond with a JSON object of the form {\"posts\": [{\"id\": <request number>, \"title\": \"...\", \"content\": \"...\"}]} holding one post per request. Keep each post's content detailed and suitable for a general audience, at least 200 words."
+AI_BATCH_MAX_TOKENS = 4096
+
+# Several posts from one completion. Returns {index: (title, content)} for the
+# prompts that came back intact; callers fall back to generate_ai_content()
+# for the rest. Each post is cached under its own prompt, like single ones.
+def generate_ai_contents(prompts, timeout=None):
+    results, pending = {}, []
+    for index, prompt in enumerate(prompts):
+        cached = api_cache.get(ai_post_cache_key(prompt))
+        if cached:
+            results[index] = (cached['title'], cached['content'])
+        else:
+            pending.append(index)
+    if not pending or not openai_client:
+        return results
+
+    requests_text = '\n\n'.join(f"Request {number}:\n{prompts[index]}" for number, index in enumerate(pending, start=1))
+    try:
+        client = deadline_openai_client(timeout)
+        response = upstreams['openai'].call(lambda: client.chat.completions.create(
+            model=AI_POST_MODEL,
+            messages=[
+                {"role": "system", "content": AI_BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": requests_text}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=min(1500 * len(pending), AI_BATCH_MAX_TOKENS)
+        ))
+        posts = json.loads(response.choices[0].message.content).get('posts')
+    except Exception as e:
+        print(f"Batched AI generation failed, falling back to single posts: {e}")
+        return results
+
+    for post in posts if isinstance(posts, list) else []:
+        if not isinstance(post, dict):
+            continue
+        try:
+            number = int(post.get('id'))
+        except (TypeError, ValueError):
+            continue
+        title, content = post.get('title'), post.get('content')
+        if not 1 <= number <= len(pending) or not isinstance(title, str) or not isinstance(content, str):
+            continue
+        if title.strip() and content.strip():
+            index = pending[number - 1]
+            results[index] = (title, content)
+            api_cache.set(ai_post_cache_key(prompts[index]), {'title': title, 'content': content}, AI_CACHE_TTL_SECONDS)
+    return results
+
+# Pulls the top-level string fields out of a JSON object while it is still
+# being streamed, so partial title/content can be shown before the object
+# closes. feed() returns [(field, text), ...] for the text decoded so far.
+class JSONFieldStream:
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, fields):
+        self.fields = set(fields)
+        self.depth = 0
+        self.expect_key = False
+        self.key = None
+        self.in_string = False
+        self.string_is_key = False
+        self.string_field = None
+        self.key_chars = []
+        self.escape = ''
+        self.high_surrogate = None
+
+    def feed(self, chunk):
+        deltas = []
+        for ch in chunk:
+            if self.in_string:
+                self._string_char(ch, deltas)
+            elif ch == '"':
+                self.in_string = True
+                self.string_is_key = self.depth == 1 and self.expect_key
+                self.string_field = self.key if self.depth == 1 and not self.expect_key and self.key in self.fields else None
+                self.key_chars = []
+            elif ch in '{[':
+                self.depth += 1
+                self.expect_key = self.depth == 1
+            elif ch in '}]':
+                self.depth -= 1
+            elif self.depth == 1 and ch == ':':
+                self.expect_key = False
+            elif self.depth == 1 and ch == ',':
+                self.expect_key = True
+                self.key = None
+        merged = []
+        for field, text in deltas:
+            if merged and merged[-1][0] == field:
+                merged[-1] = (field, merged[-1][1] + text)
+            else:
+                merged.append((field, text))
+        return merged
+
+    def _string_char(self, ch, deltas):
+        if self.escape:
+            self.escape += ch
+            if self.escape[1] == 'u':
+                if len(self.escape) < 6:
+                    return
+                text = self._decode_unicode(int(self.escape[2:], 16))
+            else:
+                text = self.ESCAPES.get(ch, ch)
+            self.escape = ''
+        elif ch == '\\':
+            self.escape = ch
+            return
+        elif ch == '"':
+            self.in_string = False
+            if self.string_is_key:
+                self.key = ''.join(self.key_chars)
+            return
+        else:
+            text = ch
+        if self.string_is_key:
+            self.key_chars.append(text)
+        elif self.string_field and text:
+            deltas.append((self.string_field, text))
+
+    def _decode_unicode(self, code):
+        if 0xD800 <= code < 0xDC00:
+            self.high_surrogate = code
+            return ''
+        if 0xDC00 <= code < 0xE000 and self.high_surrogate is not None:
+            code = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self.high_surrogate = None
+        return chr(code)
+
+def search_pexels_image(query, timeout=None):
+    if not PEXELS_API_KEY:
+        return None
+    cache_key = APICache.key('pexels', 'landscape', 'large', query)
+    cached = api_cache.get(cache_key)
+    if cached:
+        return cached
+    try:
+        headers = {'Authorization': PEXELS_API_KEY}
+        params = {'query': query, 'per_page': 1, 'orientation': 'landscape'}
+        response = upstreams['pexels'].get(PEXELS_API_URL, headers=headers, params=params, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data and data['photos']:
+            image_url = data['photos'][0]['src']['large']
+            api_cache.set(cache_key, image_url, PEXELS_CACHE_TTL_SECONDS)
+            return image_url
+        return None
+    except requests.exceptions.RequestException as e:
+        print(f"Pexels API request failed: {e}")
+        return None
+    except Exception as e:
+        print(f"An error occurred during Pexels image search: {e}")
+        return None
+
+# --------------------- AI Generation Jobs --------------------- #
+
+ai_job_executor = ThreadPoolExecutor(max_workers=AI_JOB_WORKERS, thread_name_prefix='ai-job')
+
+class TokenBucketLimiter:
+    def __init__(self, rate_per_minute, burst, max_buckets):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self.buckets = {}  # key -> (tokens, monotonic time they were counted)
+        self.lock = threading.Lock()
+
+    # Takes a token for `key`. Returns 0 if one was available, otherwise the
+    # seconds until the next one.
+    def acquire(self, key):
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            if key not in self.buckets and len(self.buckets) >= self.max_buckets:
+                self._prune(now)
+            tokens, counted_at = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted_at) * self.rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return 0
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    # Full buckets carry no state; forget them. If that doesn't make room,
+    # keep the most recently used half (the rest start over with a full
+    # bucket), so the table never grows past max_buckets.
+    def _prune(self, now):
+        self.buckets = {
+            key: (tokens, counted_at) for key, (tokens, counted_at) in self.buckets.items()
+            if tokens + (now - counted_at) * self.rate < self.burst
+        }
+        if len(self.buckets) >= self.max_buckets:
+            self.buckets = dict(heapq.nlargest(self.max_buckets // 2, self.buckets.items(), key=lambda item: item[1][1]))
+
+ai_rate_limiter = TokenBucketLimiter(AI_RATE_LIMIT_PER_MINUTE, AI_RATE_LIMIT_BURST, AI_RATE_LIMIT_MAX_BUCKETS)
+
+def ai_rate_limited_response(user_id):
+    wait = ai_rate_limiter.acquire(user_id)
+    if not wait:
+        return None
+    ai_requests_limited_total.inc(reason='rate')
+    response = jsonify({'error': 'Too many AI generation requests. Please wait a moment and try again.'})
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response, 429
+
+def ai_quota_exceeded_response():
+    db.session.rollback()
+    ai_requests_limited_total.inc(reason='quota')
+    return jsonify({'error': f'Free tier limit reached ({FREE_TIER_AI_POSTS_LIMIT} AI posts). Upgrade to premium for unlimited AI post generation.'}), 403
+
+# Checks and takes a free-tier slot in one conditional UPDATE, so parallel
+# requests can never push a user past the limit; premium rows match with a
+# +0 increment. Returns (allowed, reserved). Dialects without UPDATE ...
+# RETURNING need a second query to tell a premium user from a refusal.
+def reserve_ai_quota(user_id):
+    is_free = User.is_premium.is_(False)
+    reservation = (
+        db.update(User)
+        .where(User.id == user_id, db.or_(~is_free, User.ai_posts_generated_count < FREE_TIER_AI_POSTS_LIMIT))
+        .values(ai_posts_generated_count=User.ai_posts_generated_count + db.case((is_free, 1), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+    if db.engine.dialect.update_returning:
+        is_premium = db.session.execute(reservation.returning(User.is_premium)).scalar()
+        if is_premium is None:
+            return False, False
+        return True, not is_premium
+    if not db.session.execute(reservation).rowcount:
+        return False, False
+    is_premium = db.session.query(User.is_premium).filter_by(id=user_id).scalar()
+    return True, not is_premium
+
+def refund_ai_quota(user_id):
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id, User.ai_posts_generated_count > 0)
+        .values(ai_posts_generated_count=User.ai_posts_generated_count - 1)
+    )
+
+# Moves a job out of queued/running exactly once; returns False if some
+# other path (worker or stale check) already finished it.
+def finish_ai_job(job_id, user_id, quota_reserved, **fields):
+    result = db.session.execute(
+        db.update(GenerationJob)
+        .where(GenerationJob.id == job_id, GenerationJob.status.in_(['queued', 'running']))
+        .values(updated_at=datetime.utcnow(), **fields)
+    )
+    if not result.rowcount:
+        db.session.rollback()
+        return False
+    if fields.get('status') == 'failed' and quota_reserved:
+        refund_ai_quota(user_id)
+    db.session.commit()
+    return True
+
+def run_ai_job(app, job_id):
     with app.app_context():
-        print(f"[{datetime.now()}] Running daily AI post generation job...")
-        if not newsapi_client:
-            print("NewsAPI client not initialized. Skipping news fetch.")
+        job = db.session.get(GenerationJob, job_id)
+        if not job:
             return
-        if not openai_client:
-            print("OpenAI client not initialized. Skipping AI generation.")
+        user_id, prompt, quota_reserved = job.user_id, job.prompt, job.quota_reserved
+        started = db.session.execute(
+            db.update(GenerationJob)
+            .where(GenerationJob.id == job_id, GenerationJob.status == 'queued')
+            .values(status='running', updated_at=datetime.utcnow())
+        )
+        db.session.commit()
+        if not started.rowcount:
             return
-        
-        global AI_USER_ID
-        if AI_USER_ID is None:
-            ai_user = User.query.filter_by(username='ai_writer').first()
-            if not ai_user:
-                ai_user = User(username='ai_writer', password=os.urandom(16).hex())
-                db.session.add(ai_user)
+        try:
+            title, content, ai_error = generate_ai_content(prompt)
+            if not ai_error and (not title or not content):
+                ai_error = 'Failed to generate content from AI. Please try a different prompt.'
+            if ai_error:
+                finish_ai_job(job_id, user_id, quota_reserved, status='failed', error=ai_error[:500])
+                return
+            image_url = search_pexels_image(title.split(':')[0].strip())
+            finish_ai_job(job_id, user_id, quota_reserved, status='succeeded', title=title[:200], content=content, image_url=image_url)
+        except Exception as e:
+            db.session.rollback()
+            print(f"AI generation job {job_id} crashed: {e}")
+            finish_ai_job(job_id, user_id, quota_reserved, status='failed', error=f'An unexpected error occurred: {e}'[:500])
+
+@timed_job('sweep_ai_jobs')
+def sweep_ai_jobs():
+    now = datetime.utcnow()
+    stale = db.session.query(GenerationJob.id, GenerationJob.user_id, GenerationJob.quota_reserved).filter(
+        GenerationJob.status.in_(['queued', 'running']),
+        GenerationJob.updated_at < now - timedelta(seconds=AI_JOB_STALE_SECONDS)
+    ).all()
+    db.session.rollback()
+    for job_id, user_id, quota_reserved in stale:
+        finish_ai_job(job_id, user_id, quota_reserved, status='failed', error='Generation timed out. Please try again.')
+    purged = db.session.execute(
+        db.delete(GenerationJob).where(
+            GenerationJob.status.in_(['succeeded', 'failed']),
+            GenerationJob.updated_at < now - timedelta(days=AI_JOB_RETENTION_DAYS)
+        )
+    ).rowcount
+    db.session.commit()
+    if stale or purged:
+        print(f"AI job sweep: failed {len(stale)} stale jobs, deleted {purged} old jobs.")
+
+def serialize_ai_job(job):
+    data = {'job_id': job.id, 'status': job.status}
+    if job.status == 'succeeded':
+        data.update({'title': job.title, 'content': job.content, 'image_url': job.image_url})
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return data
+
+@bp.route('/api/generate_ai_post', methods=['POST'])
+def generate_ai_post_manual():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.json
+    prompt = data.get('prompt')
+    if not prompt:
+        return jsonify({'error': 'Prompt is required'}), 400
+
+    limited = ai_rate_limited_response(user_id)
+    if limited:
+        return limited
+
+    allowed, quota_reserved = reserve_ai_quota(user_id)
+    if not allowed:
+        return ai_quota_exceeded_response()
+
+    job = GenerationJob(user_id=user_id, prompt=prompt, quota_reserved=quota_reserved)
+    db.session.add(job)
+    db.session.commit()
+    ai_job_executor.submit(run_ai_job, current_app._get_current_object(), job.id)
+    return jsonify(serialize_ai_job(job)), 202
+
+@bp.route('/api/generate_ai_post/<job_id>', methods=['GET'])
+def get_ai_post_job(job_id):
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    job = db.session.get(GenerationJob, job_id)
+    if not job or job.user_id != user_id:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if job.status in ('queued', 'running') and datetime.utcnow() - job.updated_at > timedelta(seconds=AI_JOB_STALE_SECONDS):
+        finish_ai_job(job.id, job.user_id, job.quota_reserved, status='failed', error='Generation timed out. Please try again.')
+        db.session.refresh(job)
+
+    return jsonify(serialize_ai_job(job))
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+# Same contract as the job endpoint, but relays the completion as Server-Sent
+# Events: `delta` ({field, text}) while tokens arrive, then `done` with the
+# final post or `error`.
+@bp.route('/api/generate_ai_post/stream', methods=['POST'])
+def generate_ai_post_stream():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.json
+    prompt = data.get('prompt')
+    if not prompt:
+        return jsonify({'error': 'Prompt is required'}), 400
+    if not openai_client:
+        return jsonify({'error': 'OpenAI API key is not configured.'}), 500
+
+    limited = ai_rate_limited_response(user_id)
+    if limited:
+        return limited
+
+    allowed, quota_reserved = reserve_ai_quota(user_id)
+    if not allowed:
+        return ai_quota_exceeded_response()
+    db.session.commit()
+
+    # The slot is refunded unless `done` goes out, including when the client
+    # disconnects mid-stream (GeneratorExit at a yield)
+    def events():
+        delivered = False
+        try:
+            for sse in stream_events():
+                delivered = sse.startswith('event: done')
+                yield sse
+        finally:
+            if quota_reserved and not delivered:
+                db.session.rollback()
+                refund_ai_quota(user_id)
                 db.session.commit()
-                print("Created 'ai_writer' user for automated posts.")
-            AI_USER_ID = ai_user.id
-        
-        for category in NEWS_CATEGORIES:
-            try:
-                top_headlines = newsapi_client.get_top_headlines(category=category, language='en', country='us', page_size=1)
-                articles = top_headlines['articles']
-                if not articles:
-                    print(f"No articles found for category: {category}")
-                    continue
-                article = articles[0]
-                news_title = article.get('title')
-                news_description = article.get('description') or news_title
-                if not news_title or news_title == '[Removed]':
-                    print(f"Skipping article due to missing or removed title in category: {category}")
-                    continue
-                prompt = f"Write a compelling blog post about the following news article:\n\nTitle: \"{news_title}\"\nDescription: \"{news_description}\"\n\nMake it engaging and informative, about 300-500 words. Include an introduction, a few body paragraphs, and a conclusion. Do not include external links unless explicitly asked."
-                blog_title, blog_content, ai_error = generate_ai_content(prompt)
-                if ai_error:
-                    print(f"AI generation failed for news: {news_title}. Error: {ai_error}")
-                    continue
-                if not blog_title or not blog_content:
-                    print(f"AI generated empty title or content for news: {news_title}")
+
+    def stream_events():
+        yield sse_event('start', {})
+        cache_key = ai_post_cache_key(prompt)
+        cached = api_cache.get(cache_key)
+        if cached:
+            yield sse_event('delta', {'field': 'title', 'text': cached['title']})
+            yield sse_event('delta', {'field': 'content', 'text': cached['content']})
+            image_url = search_pexels_image(cached['title'].split(':')[0].strip())
+            yield sse_event('done', {'title': cached['title'], 'content': cached['content'], 'image_url': image_url})
+            return
+
+        parser = JSONFieldStream(['title', 'content'])
+        raw_output = []
+        try:
+            stream = upstreams['openai'].call(lambda: openai_client.chat.completions.create(stream=True, **ai_post_completion_args(prompt)))
+            with stream:
+                for chunk in stream:
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if not text:
+                        continue
+                    raw_output.append(text)
+                    for field, delta in parser.feed(text):
+                        yield sse_event('delta', {'field': field, 'text': delta})
+            parsed_output = json.loads(''.join(raw_output))
+            title, content = parsed_output.get('title'), parsed_output.get('content')
+            error = None if title and content else 'Failed to generate content from AI. Please try a different prompt.'
+        except json.JSONDecodeError:
+            print(f"Error decoding AI response: {''.join(raw_output)}")
+            error = "Failed to parse AI response."
+        except openai.APIError as e:
+            print(f"OpenAI API error: {e}")
+            error = f"OpenAI API error: {e}"
+        except UpstreamUnavailable as e:
+            print(e)
+            error = str(e)
+        except Exception as e:
+            print(f"An unexpected error occurred during AI generation: {e}")
+            error = f"An unexpected error occurred: {e}"
+
+        if error:
+            yield sse_event('error', {'error': error})
+            return
+
+        api_cache.set(cache_key, {'title': title, 'content': content}, AI_CACHE_TTL_SECONDS)
+        image_url = search_pexels_image(title.split(':')[0].strip())
+        yield sse_event('done', {'title': title, 'content': content, 'image_url': image_url})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# --------------------- News Pipeline --------------------- #
+
+def fetch_top_headlines(category, page_size=1, timeout=None):
+    headers = {'X-Api-Key': NEWS_API_KEY}
+    params = {'category': category, 'language': 'en', 'country': 'us', 'pageSize': page_size}
+    response = upstreams['newsapi'].get(NEWS_API_URL, headers=headers, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json().get('articles', [])
+
+news_api_slots = threading.BoundedSemaphore(NEWS_API_CONCURRENCY)
+openai_slots = threading.BoundedSemaphore(OPENAI_CONCURRENCY)
+pexels_slots = threading.BoundedSemaphore(PEXELS_CONCURRENCY)
+
+class CategoryTimeout(Exception):
+    pass
+
+def remaining_time(deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise CategoryTimeout()
+    return remaining
+
+# Runs in a pipeline worker thread: no database access here. Returns the post
+# fields, or None if the category produced nothing usable.
+def generate_post_for_category(category):
+    deadline = time.monotonic() + NEWS_CATEGORY_TIMEOUT_SECONDS
+    with news_api_slots:
+        articles = fetch_top_headlines(category, timeout=remaining_time(deadline))
+    if not articles:
+        print(f"No articles found for category: {category}")
+        return None
+    article = articles[0]
+    if not usable_article(article):
+        print(f"Skipping article due to missing or removed title in category: {category}")
+        return None
+    news_title = article['title']
+    with openai_slots:
+        blog_title, blog_content, ai_error = generate_ai_content(news_post_prompt(article), timeout=remaining_time(deadline))
+    if ai_error:
+        print(f"AI generation failed for news: {news_title}. Error: {ai_error}")
+        return None
+    if not blog_title or not blog_content:
+        print(f"AI generated empty title or content for news: {news_title}")
+        return None
+    return news_post_fields(article, blog_title, blog_content, deadline)
+
+def usable_article(article):
+    return bool(article.get('title')) and article['title'] != '[Removed]'
+
+def news_post_prompt(article):
+    news_title = article['title']
+    news_description = article.get('description') or news_title
+    return f"Write a compelling blog post about the following news article:\n\nTitle: \"{news_title}\"\nDescription: \"{news_description}\"\n\nMake it engaging and informative, about 300-500 words. Include an introduction, a few body paragraphs, and a conclusion. Do not include external links unless explicitly asked."
+
+# Looks up the image and assembles the row; no database access
+def news_post_fields(article, blog_title, blog_content, deadline):
+    image_query = article['title'].split(':')[0].strip()
+    with pexels_slots:
+        image_url = search_pexels_image(image_query, timeout=remaining_time(deadline))
+    if not image_url:
+        print(f"No Pexels image found for query: {image_query}")
+    return {
+        'title': blog_title,
+        'content': blog_content,
+        'image_url': image_url,
+        'source_title': article['title'][:300],
+        'source_hash': headline_hash(article['title'])
+    }
+
+# Headlines compare without case, punctuation or a trailing " - Publisher"
+def normalize_headline(title):
+    title = re.sub(r'\s+-\s+[^-]+$', '', title)
+    return ' '.join(re.findall(r'[a-z0-9]+', title.lower()))
+
+def headline_hash(title):
+    return hashlib.sha256(normalize_headline(title).encode()).hexdigest()
+
+def headline_shingles(title, size=2):
+    words = normalize_headline(title).split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def jaccard_similarity(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+# Up to NEWS_POSTS_PER_CATEGORY articles per category whose headline hasn't
+# been published (exact match on any post) and isn't a near-duplicate of a
+# recent post or of another pick in this run (same story in two categories).
+# Returns [(category, article)] and the categories left with only duplicates.
+def select_fresh_articles(articles_by_category):
+    candidates = [
+        (category, article)
+        for category in NEWS_CATEGORIES
+        for article in articles_by_category.get(category, [])
+        if usable_article(article)
+    ]
+    hashes = {headline_hash(article['title']) for _, article in candidates}
+    published = set(db.session.scalars(db.select(Post.source_hash).where(Post.source_hash.in_(hashes)))) if hashes else set()
+    seen = [
+        headline_shingles(title) for (title,) in
+        db.session.query(Post.source_title).filter(Post.source_title.isnot(None))
+        .order_by(Post.created_at.desc()).limit(NEWS_DEDUP_LOOKBACK_POSTS)
+    ]
+
+    picks, counts = [], {}
+    for category, article in candidates:
+        if counts.get(category, 0) >= NEWS_POSTS_PER_CATEGORY:
+            continue
+        article_hash = headline_hash(article['title'])
+        shingles = headline_shingles(article['title'])
+        if article_hash in published or any(jaccard_similarity(shingles, other) >= NEWS_DUPLICATE_SIMILARITY for other in seen):
+            continue
+        published.add(article_hash)
+        seen.append(shingles)
+        picks.append((category, article))
+        counts[category] = counts.get(category, 0) + 1
+    duplicates_only = {category for category, _ in candidates} - set(counts)
+    return picks, duplicates_only
+
+def fetch_category_headlines(category):
+    with news_api_slots:
+        return fetch_top_headlines(category, page_size=NEWS_HEADLINES_PER_CATEGORY, timeout=NEWS_CATEGORY_TIMEOUT_SECONDS)
+
+# Writes the posts for a group of picks with one completion, retrying any the
+# batch dropped one at a time. Runs in a pipeline worker: no database access.
+def generate_posts_for_articles(picks):
+    deadline = time.monotonic() + NEWS_BATCH_TIMEOUT_SECONDS
+    prompts = [news_post_prompt(article) for _, article in picks]
+    with openai_slots:
+        contents = generate_ai_contents(prompts, timeout=remaining_time(deadline))
+    ai_batch_posts_total.inc(len(contents), source='batch')
+
+    results = []
+    for index, (category, article) in enumerate(picks):
+        try:
+            if index in contents:
+                blog_title, blog_content = contents[index]
+            else:
+                with openai_slots:
+                    blog_title, blog_content, ai_error = generate_ai_content(prompts[index], timeout=remaining_time(deadline))
+                if ai_error or not blog_title or not blog_content:
+                    print(f"AI generation failed for news: {article['title']}. Error: {ai_error or 'empty title or content'}")
+                    results.append((category, None, 'skipped'))
                     continue
-                image_query = news_title.split(':')[0].strip()
-                image_url = search_pexels_image(image_query)
-                if not image_url:
-                    print(f"No Pexels image found for query: {image_query}")
-                new_post = Post(
-                    title=blog_title,
-                    content=blog_content,
-                    image_url=image_url,
-                    user_id=AI_USER_ID,
-                    views=0,
-                    is_ai_generated=True,
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(new_post)
-                db.session.commit()
-                print(f"Successfully generated and saved AI post: '{blog_title}' from category '{category}'")
+                ai_batch_posts_total.inc(source='single')
+            results.append((category, news_post_fields(article, blog_title, blog_content, deadline), 'generated'))
+        except CategoryTimeout:
+            print(f"Timed out generating post for category {category} after {NEWS_BATCH_TIMEOUT_SECONDS}s")
+            results.append((category, None, 'timeout'))
+    return results
+
+def generate_news_posts_batched():
+    articles_by_category = {}
+    with ThreadPoolExecutor(max_workers=NEWS_PIPELINE_WORKERS, thread_name_prefix='news-pipeline') as pool:
+        futures = {pool.submit(fetch_category_headlines, category): category for category in NEWS_CATEGORIES}
+        for future in as_completed(futures):
+            category = futures[future]
+            try:
+                articles_by_category[category] = future.result()
+            except Exception as e:
+                print(f"Error fetching headlines for category {category}: {e}")
+                news_category_outcomes_total.inc(category=category, outcome='error')
+
+    picks, duplicates_only = select_fresh_articles(articles_by_category)
+    for category in duplicates_only:
+        print(f"Only already-published headlines in category: {category}")
+        news_category_outcomes_total.inc(category=category, outcome='duplicate')
+    for category in set(articles_by_category) - {category for category, _ in picks} - duplicates_only:
+        print(f"No articles found for category: {category}")
+        news_category_outcomes_total.inc(category=category, outcome='skipped')
+
+    generated = []
+    groups = [picks[i:i + NEWS_POSTS_PER_COMPLETION] for i in range(0, len(picks), NEWS_POSTS_PER_COMPLETION)]
+    with ThreadPoolExecutor(max_workers=NEWS_PIPELINE_WORKERS, thread_name_prefix='news-pipeline') as pool:
+        futures = {pool.submit(generate_posts_for_articles, group): group for group in groups}
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"Error generating posts for categories {', '.join(category for category, _ in futures[future])}: {e}")
+                results = [(category, None, 'error') for category, _ in futures[future]]
+            for category, post_fields, outcome in results:
+                if post_fields:
+                    generated.append((category, post_fields))
+                news_category_outcomes_total.inc(category=category, outcome=outcome)
+    return generated
+
+def generate_news_posts_per_category():
+    generated = []
+    with ThreadPoolExecutor(max_workers=NEWS_PIPELINE_WORKERS, thread_name_prefix='news-pipeline') as pool:
+        futures = {pool.submit(generate_post_for_category, category): category for category in NEWS_CATEGORIES}
+        for future in as_completed(futures):
+            category = futures[future]
+            try:
+                post_fields = future.result()
+            except CategoryTimeout:
+                print(f"Timed out generating post for category {category} after {NEWS_CATEGORY_TIMEOUT_SECONDS}s")
+                news_category_outcomes_total.inc(category=category, outcome='timeout')
+                continue
             except Exception as e:
-                db.session.rollback()
                 print(f"Error generating post for category {category}: {e}")
-        print(f"[{datetime.now()}] Daily AI post generation job finished.")
+                news_category_outcomes_total.inc(category=category, outcome='error')
+                continue
+            if post_fields:
+                generated.append((category, post_fields))
+            news_category_outcomes_total.inc(category=category, outcome='generated' if post_fields else 'skipped')
+    return generated
+
+@timed_job('fetch_news')
+def fetch_news_and_generate_posts():
+    print(f"[{datetime.now()}] Running daily AI post generation job...")
+    if not NEWS_API_KEY:
+        print("NEWS_API_KEY not configured. Skipping news fetch.")
+        return
+    if not openai_client:
+        print("OpenAI client not initialized. Skipping AI generation.")
+        return
+        
+    global AI_USER_ID
+    if AI_USER_ID is None:
+        ai_user = User.query.filter_by(username='ai_writer').first()
+        if not ai_user:
+            ai_user = User(username='ai_writer', password=os.urandom(16).hex())
+            db.session.add(ai_user)
+            adjust_site_stats(users=1)
+            bump_table_versions('user')
+            db.session.commit()
+            invalidate_read_caches()
+            print("Created 'ai_writer' user for automated posts.")
+        AI_USER_ID = ai_user.id
+
+    generated = generate_news_posts_batched() if NEWS_BATCH_GENERATION else generate_news_posts_per_category()
+
+    if not generated:
+        print(f"[{datetime.now()}] Daily AI post generation job finished. No posts generated.")
+        return
+
+    # One transaction for the whole run
+    try:
+        now = datetime.utcnow()
+        db.session.add_all([
+            Post(user_id=AI_USER_ID, views=0, is_ai_generated=True, created_at=now, **post_fields)
+            for _, post_fields in generated
+        ])
+        adjust_post_stats(AI_USER_ID, posts=len(generated), ai_posts=len(generated))
+        bump_table_versions('post')
+        db.session.commit()
+        invalidate_read_caches()
+        queue_image_ingest([post_fields['image_url'] for _, post_fields in generated])
+        for category, post_fields in generated:
+            print(f"Successfully generated and saved AI post: '{post_fields['title']}' from category '{category}'")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving generated posts: {e}")
+    print(f"[{datetime.now()}] Daily AI post generation job finished.")
 
 # --------------------- Statistics and Premium Routes --------------------- #
 
-@app.route('/api/stats', methods=['GET'])
+@bp.route('/api/stats', methods=['GET'])
 def get_global_stats():
-    total_users = User.query.count()
-    total_posts = Post.query.count()
-    total_views = db.session.query(db.func.sum(Post.views)).scalar() or 0
-    return jsonify({
-        'total_users': total_users,
-        'total_posts': total_posts,
-        'total_views': total_views
-    })
+    stats = dict(stats_cache.get('global', load_global_stats))
+    stats['total_views'] += view_counter.pending_total()
+    return jsonify(stats)
 
-@app.route('/api/me/stats', methods=['GET'])
+@bp.route('/api/me/stats', methods=['GET'])
 def get_user_stats():
     user_id = session.get('user_id')
     if not user_id:
@@ -434,22 +2873,18 @@ def get_user_stats():
         session.clear()
         return jsonify({'error': 'User not found'}), 404
     
-    db.session.refresh(user)
-
-    user_posts_count = Post.query.filter_by(user_id=user_id).count()
-    user_total_views = db.session.query(db.func.sum(Post.views)).filter_by(user_id=user_id).scalar() or 0
-    user_ai_posts_count = user.ai_posts_generated_count
-    
+    # The user row carries its own counters, so this is a single primary-key read
     return jsonify({
         'username': user.username,
         'is_premium': user.is_premium,
-        'posts_count': user_posts_count,
-        'total_views_on_posts': user_total_views,
-        'ai_posts_generated_count': user_ai_posts_count,
+        'posts_count': user.posts_count,
+        'total_views_on_posts': user.views_count + view_counter.pending_for_user(user_id),
+        'ai_posts_count': user.ai_posts_count,
+        'ai_posts_generated_count': user.ai_posts_generated_count,
         'free_tier_ai_limit': FREE_TIER_AI_POSTS_LIMIT
     })
 
-@app.route('/api/fastspring/checkout', methods=['POST'])
+@bp.route('/api/fastspring/checkout', methods=['POST'])
 def create_fastspring_checkout():
     user_id = session.get('user_id')
     if not user_id:
@@ -474,68 +2909,489 @@ def create_fastspring_checkout():
     )
     return jsonify({'checkout_url': checkout_url})
 
-@app.route('/api/fastspring/webhook', methods=['POST'])
-def fastspring_webhook_handler():
-    data = request.json
-    print(f"FastSpring Webhook Received: {data}")
-    
-    for event in data.get('events', []):
-        if event.get('type') == 'order.completed' or event.get('type') == 'subscription.activated':
-            tags = event['data'].get('tags', [])
-            user_id_from_tag = None
-            for tag in tags:
-                if tag.startswith('user_id_'):
-                    try:
-                        user_id_from_tag = int(tag.split('_')[1])
-                        break
-                    except (ValueError, IndexError):
-                        continue
-            
-            if user_id_from_tag:
-                user = User.query.get(user_id_from_tag)
-                if user:
-                    user.is_premium = True
-                    user.ai_posts_generated_count = 0 
-                    db.session.commit()
-                    print(f"User {user.username} (ID: {user.id}) marked as premium via webhook. AI posts count reset.")
-                else:
-                    print(f"Webhook: User with ID {user_id_from_tag} not found.")
-            else:
+WEBHOOK_PREMIUM_EVENTS = ('order.completed', 'subscription.activated')
+
+def webhook_event_id(webhook_event):
+    event_id = webhook_event.get('id')
+    if isinstance(event_id, str) and event_id:
+        return event_id[:100]
+    return hashlib.sha256(json.dumps(webhook_event, sort_keys=True).encode()).hexdigest()
+
+def webhook_user_id(webhook_event):
+    data = webhook_event.get('data')
+    tags = data.get('tags', []) if isinstance(data, dict) else []
+    for tag in tags:
+        if isinstance(tag, str) and tag.startswith('user_id_'):
+            try:
+                return int(tag[len('user_id_'):])
+            except ValueError:
+                continue
+    return None
+
+# Stores the events this delivery adds and returns how many that was; ids
+# already on record (retried deliveries) are dropped.
+def record_webhook_events(events):
+    if not events:
+        return 0
+    known = set(db.session.scalars(db.select(WebhookEvent.id).where(WebhookEvent.id.in_(list(events)))))
+    new_events = [
+        WebhookEvent(id=event_id, type=str(webhook_event.get('type'))[:100], payload=json.dumps(webhook_event))
+        for event_id, webhook_event in events.items() if event_id not in known
+    ]
+    db.session.add_all(new_events)
+    try:
+        db.session.commit()
+        return len(new_events)
+    except db.exc.IntegrityError:
+        # A concurrent redelivery recorded some of them first
+        db.session.rollback()
+    recorded = 0
+    for webhook_event in new_events:
+        try:
+            with db.session.begin_nested():
+                db.session.add(WebhookEvent(id=webhook_event.id, type=webhook_event.type, payload=webhook_event.payload))
+            recorded += 1
+        except db.exc.IntegrityError:
+            pass
+    db.session.commit()
+    return recorded
+
+class WebhookProcessor:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+
+    # Wakes the background thread; called after recording a delivery
+    def notify(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='webhook-processor', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    # Applies pending events until none are left. Needs an app context.
+    def process_pending(self):
+        total = 0
+        while True:
+            try:
+                applied = self._process_batch()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Webhook processing failed, events stay pending: {e}")
+                return total
+            if not applied:
+                return total
+            total += applied
+
+    # One transaction: claim a batch, load every referenced user in one query
+    # and apply the events. Returns the number of events claimed.
+    def _process_batch(self):
+        events = db.session.scalars(
+            db.select(WebhookEvent).where(WebhookEvent.status == 'pending')
+            .order_by(WebhookEvent.received_at, WebhookEvent.id).limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not events:
+            return 0
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            db.update(WebhookEvent)
+            .where(WebhookEvent.id.in_([webhook_event.id for webhook_event in events]), WebhookEvent.status == 'pending')
+            .values(status='processed', processed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if claimed.rowcount != len(events):
+            # Another process got to some of these first; start over
+            db.session.rollback()
+            return self._process_batch()
+
+        targets = {}
+        for webhook_event in events:
+            if webhook_event.type not in WEBHOOK_PREMIUM_EVENTS:
+                self._skip(webhook_event, now, 'Unhandled event type')
+                continue
+            user_id = webhook_user_id(json.loads(webhook_event.payload))
+            if user_id is None:
                 print("Webhook: User ID not found in tags for order/subscription event.")
+                self._skip(webhook_event, now, 'No user_id tag')
+            else:
+                targets[webhook_event] = user_id
+
+        users = {user.id: user for user in User.query.filter(User.id.in_(set(targets.values())))} if targets else {}
+        for webhook_event, user_id in targets.items():
+            user = users.get(user_id)
+            if not user:
+                print(f"Webhook: User with ID {user_id} not found.")
+                self._skip(webhook_event, now, 'User not found')
+                continue
+            user.is_premium = True
+            user.ai_posts_generated_count = 0
+            webhook_events_total.inc(outcome='processed')
+            print(f"User {user.username} (ID: {user.id}) marked as premium via webhook. AI posts count reset.")
+        if users:
+            bump_table_versions('user')
+        db.session.commit()
+        if users:
+            invalidate_read_caches()
+        return len(events)
+
+    def _skip(self, webhook_event, now, reason):
+        webhook_event.status, webhook_event.processed_at, webhook_event.error = 'skipped', now, reason
+        webhook_events_total.inc(outcome='skipped')
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self.app.app_context():
+                self.process_pending()
+
+webhook_processor = WebhookProcessor(WEBHOOK_BATCH_SIZE)
+
+# Scheduled sweep: applies events left pending by a process that exited
+# before its background thread got to them, and forgets old event ids.
+@timed_job('process_webhook_events')
+def process_webhook_events():
+    webhook_processor.process_pending()
+    cutoff = datetime.utcnow() - timedelta(days=WEBHOOK_EVENT_RETENTION_DAYS)
+    db.session.execute(db.delete(WebhookEvent).where(WebhookEvent.status != 'pending', WebhookEvent.received_at < cutoff))
+    db.session.commit()
 
+# FastSpring signs each delivery: X-FS-Signature is the base64 HMAC-SHA256 of
+# the raw body under the webhook secret. Without a secret nothing verifies.
+def fastspring_signature_valid(body, signature):
+    if not FASTSPRING_WEBHOOK_SECRET or not signature:
+        return False
+    expected = base64.b64encode(hmac.new(FASTSPRING_WEBHOOK_SECRET.encode(), body, hashlib.sha256).digest()).decode()
+    return hmac.compare_digest(expected, signature)
+
+# Records the delivery and acknowledges it; the premium upgrades are applied
+# by webhook_processor in the background.
+@bp.route('/api/fastspring/webhook', methods=['POST'])
+def fastspring_webhook_handler():
+    body = request.get_data()
+    if not fastspring_signature_valid(body, request.headers.get('X-FS-Signature')):
+        if not FASTSPRING_WEBHOOK_SECRET:
+            print("FastSpring webhook rejected: FASTSPRING_WEBHOOK_SECRET is not set.")
+        return jsonify({'error': 'Invalid signature'}), 401
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return jsonify({'error': 'Invalid JSON'}), 400
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid JSON'}), 400
+    events = {}
+    for webhook_event in data.get('events', []):
+        if isinstance(webhook_event, dict):
+            events.setdefault(webhook_event_id(webhook_event), webhook_event)
+    recorded = record_webhook_events(events)
+    webhook_events_total.inc(recorded, outcome='received')
+    webhook_events_total.inc(len(events) - recorded, outcome='duplicate')
+    print(f"FastSpring Webhook Received: {len(events)} events, {len(events) - recorded} already recorded")
+    if recorded:
+        webhook_processor.notify()
     return jsonify({'status': 'success'}), 200
 
-# --------------------- Run App and Scheduler --------------------- #
+# --------------------- Schema Migrations --------------------- #
 
-# --- MOVED SCHEDULER SETUP TO THE END ---
+class SchemaMigration(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
-def create_tables_and_seed_ai_user():
-    with app.app_context():
-        # IMPORTANT: Uncomment db.drop_all() for one run to re-create the database.
-        # This will delete ALL existing users and posts!
-        db.drop_all() # <-- TEMPORARILY UNCOMMENTED FOR THE FIX
-        db.create_all()
-        print("\n!!! DATABASE TABLES DROPPED AND RECREATED. PLEASE RE-COMMENT 'db.drop_all()' AFTER THIS RUN. !!!\n")
+def create_tables(conn, *models):
+    db.metadata.create_all(conn, tables=[model.__table__ for model in models])
+
+# ALTER TABLE ... ADD COLUMN for model columns the live table doesn't have yet.
+# New columns must be NOT NULL with a scalar default (or nullable).
+def add_missing_columns(conn, model, *column_names):
+    table = model.__table__
+    existing = {column['name'] for column in db.inspect(conn).get_columns(table.name)}
+    preparer = conn.dialect.identifier_preparer
+    for name in column_names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.quote(name)} {column.type.compile(dialect=conn.dialect)}"
+        if column.default is not None:
+            default = db.literal(column.default.arg, column.type).compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+            ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+        conn.execute(db.text(ddl))
+
+# Creates the model's indexes with these names. Steps list only the indexes
+# they introduce: the model may also declare indexes on columns that a later
+# step adds.
+def create_index(conn, model, *names):
+    indexes = {index.name: index for index in model.__table__.indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+def backfill_content_hashes(conn, batch_size=1000):
+    post = Post.__table__
+    while True:
+        rows = conn.execute(
+            db.select(post.c.id, post.c.title, post.c.content).where(post.c.content_hash.is_(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        conn.execute(
+            db.update(post).where(post.c.id == db.bindparam('post_id')).values(content_hash=db.bindparam('hash')),
+            [{'post_id': row.id, 'hash': post_content_hash(row.title, row.content)} for row in rows]
+        )
 
-        global AI_USER_ID
+# Append-only. Every step must be safe to run against a database that already
+# has (some of) its changes, since fresh databases get the current models from
+# step 1.
+MIGRATIONS = [
+    (1, 'Initial user and post tables', lambda conn: create_tables(conn, User, Post)),
+    (2, 'Materialized stats counters', lambda conn: (
+        add_missing_columns(conn, User, 'posts_count', 'views_count', 'ai_posts_count'),
+        create_tables(conn, SiteStats)
+    )),
+    (3, 'Background AI generation jobs', lambda conn: create_tables(conn, GenerationJob)),
+    (4, 'Table version stamps for response caching', lambda conn: create_tables(conn, TableVersion)),
+    (5, 'Full-text search index', setup_search_index),
+    (6, 'Post listing indexes', lambda conn: create_index(
+        conn, Post, 'ix_post_created_at_id', 'ix_post_user_id_created_at', 'ix_post_is_ai_generated_created_at'
+    )),
+    (7, 'Trending scores', lambda conn: create_tables(conn, TrendingScore)),
+    (8, 'Scheduler leader lock', lambda conn: create_tables(conn, SchedulerLock)),
+    (9, 'Post content hashes for bulk import', lambda conn: (
+        add_missing_columns(conn, Post, 'content_hash'),
+        create_index(conn, Post, 'ix_post_content_hash'),
+        backfill_content_hashes(conn)
+    )),
+    (10, 'Local image assets', lambda conn: create_tables(conn, ImageAsset)),
+    (11, 'News post source headlines', lambda conn: (
+        add_missing_columns(conn, Post, 'source_title', 'source_hash'),
+        create_index(conn, Post, 'ix_post_source_hash')
+    )),
+    (12, 'FastSpring webhook event log', lambda conn: create_tables(conn, WebhookEvent)),
+    (13, 'AI job sweep index', lambda conn: create_index(conn, GenerationJob, 'ix_generation_job_status_updated_at')),
+]
+
+# Held while migrating and seeding, so workers starting at once (gunicorn -w N)
+# don't race each other's DDL. PostgreSQL and MySQL use an advisory lock;
+# SQLite an exclusive transaction on a lock file beside the database.
+@contextlib.contextmanager
+def migration_lock():
+    url = db.engine.url
+    backend = url.get_backend_name()
+    if backend == 'sqlite' and url.database and url.database != ':memory:':
+        lock = sqlite3.connect(f"{url.database}.migrate-lock", timeout=MIGRATION_LOCK_TIMEOUT_SECONDS, isolation_level=None)
+        try:
+            lock.execute('BEGIN EXCLUSIVE')
+            yield
+        finally:
+            lock.close()
+    elif backend == 'postgresql':
+        with db.engine.connect() as conn:
+            conn.execute(db.text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(db.text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+    elif backend in ('mysql', 'mariadb'):
+        with db.engine.connect() as conn:
+            params = {'name': MIGRATION_LOCK_NAME, 'timeout': MIGRATION_LOCK_TIMEOUT_SECONDS}
+            if conn.execute(db.text('SELECT GET_LOCK(:name, :timeout)'), params).scalar() != 1:
+                raise RuntimeError('Timed out waiting for the migration lock')
+            try:
+                yield
+            finally:
+                conn.execute(db.text('SELECT RELEASE_LOCK(:name)'), params)
+    else:
+        yield
+
+# Callers hold migration_lock(). Returns the versions this call applied.
+def run_migrations():
+    newly_applied = []
+    with db.engine.begin() as conn:
+        create_tables(conn, SchemaMigration)
+    applied = {version for (version,) in db.session.query(SchemaMigration.version)}
+    db.session.rollback()
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"Applying migration {version}: {description}", file=sys.stderr)
+        try:
+            with db.engine.begin() as conn:
+                migrate(conn)
+                conn.execute(db.insert(SchemaMigration.__table__).values(version=version, description=description, applied_at=datetime.utcnow()))
+            newly_applied.append(version)
+        except db.exc.IntegrityError:
+            # Another process applied it first
+            print(f"Migration {version} already applied elsewhere.", file=sys.stderr)
+    return newly_applied
+
+@bp.cli.command('migrate')
+def migrate_command():
+    with migration_lock():
+        run_migrations()
+
+# --------------------- Scheduler --------------------- #
+
+# Each process runs an elector thread; the one holding the lock row runs the
+# jobs, renewing the lease every third of its TTL. If it dies, another process
+# takes over once the lease has expired.
+class LeaderScheduler:
+    def __init__(self, lock_name, ttl_seconds):
+        self.lock_name = lock_name
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.app = None
+        self.is_leader = False
+        self._jobs = []  # (fn, trigger kwargs)
+        self._scheduler = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, fn, **trigger_args):
+        self._jobs.append((fn, trigger_args))
+
+    def init_app(self, app):
+        self.app = app
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='scheduler-elector', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def try_acquire(self):
+        now = datetime.utcnow()
+        lock = SchedulerLock.__table__
+        values = {'owner': self.owner, 'expires_at': now + timedelta(seconds=self.ttl_seconds)}
+        with db.engine.begin() as conn:
+            claimed = conn.execute(
+                db.update(lock)
+                .where(lock.c.name == self.lock_name, db.or_(lock.c.owner == self.owner, lock.c.expires_at < now))
+                .values(**values)
+            ).rowcount
+        if claimed:
+            return True
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(db.insert(lock).values(name=self.lock_name, **values))
+            return True
+        except db.exc.IntegrityError:
+            return False
+
+    def stop(self):
+        self._stop.set()
+        if self._scheduler:
+            self._scheduler.shutdown(wait=False)
+        if self.is_leader:
+            try:
+                with self.app.app_context(), db.engine.begin() as conn:
+                    lock = SchedulerLock.__table__
+                    conn.execute(
+                        db.update(lock).where(lock.c.name == self.lock_name, lock.c.owner == self.owner)
+                        .values(expires_at=datetime.utcnow())
+                    )
+            except Exception as e:
+                print(f"Failed to release scheduler lock: {e}")
+            self.is_leader = False
+
+    def _run_job(self, fn):
+        with self.app.app_context():
+            fn()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    leader = self.try_acquire()
+            except Exception as e:
+                # Stand down if the lease can't be confirmed
+                print(f"Scheduler lock check failed: {e}")
+                leader = False
+            if leader and not self.is_leader:
+                if self._scheduler is None:
+                    self._scheduler = BackgroundScheduler()
+                    for fn, trigger_args in self._jobs:
+                        self._scheduler.add_job(self._run_job, 'interval', args=[fn], id=fn.__name__, **trigger_args)
+                    self._scheduler.start()
+                else:
+                    self._scheduler.resume()
+                print(f"Scheduler started in process {os.getpid()}. AI posts will be generated automatically.", file=sys.stderr)
+            elif self.is_leader and not leader:
+                self._scheduler.pause()
+                print(f"Scheduler paused in process {os.getpid()}; another process holds the lock.")
+            self.is_leader = leader
+            self._stop.wait(self.ttl_seconds / 3)
+
+scheduler = LeaderScheduler('scheduler', SCHEDULER_LOCK_TTL_SECONDS)
+scheduler.add_job(fetch_news_and_generate_posts, minutes=NEWS_FETCH_INTERVAL_MINUTES)
+scheduler.add_job(recompute_stats, minutes=STATS_RECOMPUTE_INTERVAL_MINUTES)
+scheduler.add_job(ingest_missing_images, minutes=IMAGE_BACKFILL_INTERVAL_MINUTES)
+scheduler.add_job(process_webhook_events, minutes=WEBHOOK_SWEEP_INTERVAL_MINUTES)
+scheduler.add_job(sweep_ai_jobs, minutes=AI_JOB_SWEEP_INTERVAL_MINUTES)
+CallbackMetric('scheduler_leader', 'Whether this process runs the scheduled jobs.', 'gauge',
+               lambda: {(): int(scheduler.is_leader)})
+
+# --------------------- Run App and Scheduler --------------------- #
+
+def create_tables_and_seed_ai_user():
+    global AI_USER_ID
+    with migration_lock():
+        newly_applied = run_migrations()
         ai_user = User.query.filter_by(username='ai_writer').first()
         if not ai_user:
-            ai_user = User(username='ai_writer', password=os.urandom(16).hex())
-            db.session.add(ai_user)
-            db.session.commit()
-            print("Created 'ai_writer' user for automated posts.")
+            try:
+                ai_user = User(username='ai_writer', password=os.urandom(16).hex())
+                db.session.add(ai_user)
+                db.session.commit()
+                print("Created 'ai_writer' user for automated posts.", file=sys.stderr)
+            except db.exc.IntegrityError:
+                # Another process created it first
+                db.session.rollback()
+                ai_user = User.query.filter_by(username='ai_writer').one()
         AI_USER_ID = ai_user.id
 
-if __name__ == '__main__':
-    create_tables_and_seed_ai_user()
+        # Counters are only rebuilt when the schema changed; the scheduled
+        # recompute_stats job corrects drift after that
+        if newly_applied:
+            recompute_stats()
 
-    # --- MOVED SCHEDULER SETUP TO HERE, AFTER FUNCTIONS ARE DEFINED ---
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(fetch_news_and_generate_posts, 'interval', minutes=5)
-    
-    scheduler.start()
-    print("Scheduler started. AI posts will be generated automatically.")
-    
-    atexit.register(lambda: scheduler.shutdown())
+# One-off `flask` commands (migrate, import-posts, ...) load the app too, but
+# must not take scheduler leadership; `flask run` serves, so it counts as a
+# server like a WSGI worker or `python app.py`.
+def is_cli_command():
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.command.name != 'run'
 
-    app.run(debug=True)
\ No newline at end of file
+def create_app(config=None):
+    app = Flask(__name__)
+
+    # Use environment variables for configuration
+    app.secret_key = os.getenv('SECRET_KEY', 'super-secret-key-fallback')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///blog.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    CORS(app)
+    app.register_blueprint(bp)
+    view_counter.init_app(app)
+    trending.init_app(app)
+    api_cache.init_app(app)
+    webhook_processor.init_app(app)
+
+    if AUTO_MIGRATE:
+        with app.app_context():
+            create_tables_and_seed_ai_user()
+    if RUN_SCHEDULER and not is_cli_command():
+        scheduler.init_app(app)
+    return app
+
+if __name__ == '__main__':
+    create_app().run(debug=True)
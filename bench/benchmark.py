@@ -0,0 +1,385 @@
+# Benchmark suite for app.py.
+#
+# Seeds a throwaway database, points OpenAI/NewsAPI/Pexels at local stub
+# servers, serves the app over HTTP in-process and measures throughput and
+# latency percentiles per endpoint. Results are written as JSON so runs from
+# different commits can be compared:
+#
+#   python bench/benchmark.py --users 200 --posts 20000
+#   python bench/benchmark.py --compare bench/results/<old commit>.json
+#   python bench/benchmark.py --database-url postgresql://localhost/blog_bench --reset
+#
+# --reset drops every table in the target database before seeding; only use it
+# on a database kept for benchmarking.
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    'market election league console studio launch vaccine galaxy climate budget '
+    'transfer tournament streaming robot satellite genome policy festival patch '
+    'startup senate playoff trailer battery telescope diet summit chip album'
+).split()
+
+# --------------------- Upstream Stubs --------------------- #
+
+def make_stub_handler(latency):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path.startswith('/news'):
+                page_size = int(parse_qs(urlsplit(self.path).query).get('pageSize', ['1'])[0])
+                self.send_json({'status': 'ok', 'articles': [{
+                    'title': f"{random.choice(WORDS).title()} {random.choice(WORDS)} update {random.randint(0, 10 ** 9)}",
+                    'description': ' '.join(random.choices(WORDS, k=30))
+                } for _ in range(page_size)]})
+            else:
+                self.send_json({'photos': [{'src': {'large': f"https://images.example/{random.randint(0, 10 ** 6)}.jpg"}}]})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            time.sleep(latency)
+            def make_post():
+                return {
+                    'title': f"{random.choice(WORDS).title()}: {' '.join(random.choices(WORDS, k=5))}",
+                    'content': ''.join(f"<p>{' '.join(random.choices(WORDS, k=60))}</p>" for _ in range(4))
+                }
+            # Batched news requests number their prompts "Request N:"
+            prompt = body.get('messages', [{}])[-1].get('content', '')
+            batch_size = len(re.findall(r'^Request \d+:', prompt, re.M))
+            if batch_size:
+                completion = json.dumps({'posts': [dict(make_post(), id=number) for number in range(1, batch_size + 1)]})
+            else:
+                completion = json.dumps(make_post())
+            if body.get('stream'):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for start in range(0, len(completion), 16):
+                    chunk = {'id': 'bench', 'object': 'chat.completion.chunk', 'created': 0, 'model': body.get('model'),
+                             'choices': [{'index': 0, 'delta': {'content': completion[start:start + 16]}, 'finish_reason': None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+                return
+            self.send_json({
+                'id': 'bench', 'object': 'chat.completion', 'created': 0, 'model': body.get('model'),
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': completion}}],
+                'usage': {'prompt_tokens': 100, 'completion_tokens': 300, 'total_tokens': 400}
+            })
+
+    return StubHandler
+
+def start_server(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# --------------------- Setup --------------------- #
+
+def configure_environment(args, workdir):
+    stub = start_server(ThreadingHTTPServer(('127.0.0.1', 0), make_stub_handler(args.upstream_latency_ms / 1000)))
+    stub_url = f"http://127.0.0.1:{stub.server_port}"
+    os.environ.update({
+        'DATABASE_URL': args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'API_CACHE_PATH': os.path.join(workdir, 'api_cache.db'),
+        'OPENAI_API_KEY': 'bench',
+        'OPENAI_BASE_URL': f"{stub_url}/v1",
+        'PEXELS_API_KEY': 'bench',
+        'PEXELS_API_URL': f"{stub_url}/pexels",
+        'NEWS_API_KEY': 'bench',
+        'NEWS_API_URL': f"{stub_url}/news",
+        'AUTO_MIGRATE': '0',
+        'RUN_SCHEDULER': '0',
+        # A few bench users submit every AI job; measure throughput, not the limiter
+        'AI_RATE_LIMIT_PER_MINUTE': '0',
+    })
+    return stub
+
+def reset_database(app, blog):
+    with app.app_context():
+        with blog.db.engine.begin() as conn:
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql('DROP TABLE IF EXISTS post_fts')
+            existing = blog.db.MetaData()
+            existing.reflect(conn)
+            existing.drop_all(conn)
+
+def seed_database(app, blog, users, posts):
+    started = time.perf_counter()
+    with app.app_context():
+        blog.create_tables_and_seed_ai_user()
+        if blog.Post.query.count():
+            print('Database already seeded; reusing it.')
+            return [row.id for row in blog.db.session.query(blog.Post.id)], time.perf_counter() - started
+        blog.db.session.execute(blog.db.insert(blog.User), [
+            {'username': f"bench_user_{i}", 'password': 'bench', 'is_premium': True}
+            for i in range(users)
+        ])
+        user_ids = [row.id for row in blog.db.session.query(blog.User.id).filter(blog.User.username.like('bench_user_%'))]
+        now = datetime.utcnow()
+        rows = []
+        for i in range(posts):
+            rows.append({
+                'title': ' '.join(random.choices(WORDS, k=6)).title(),
+                'content': ''.join(f"<p>{' '.join(random.choices(WORDS, k=80))}</p>" for _ in range(5)),
+                'image_url': f"https://images.example/{i}.jpg",
+                'user_id': random.choice(user_ids),
+                'views': random.randint(0, 500),
+                'is_ai_generated': random.random() < 0.3,
+                'created_at': now - timedelta(minutes=i)
+            })
+            if len(rows) == 5000:
+                blog.db.session.execute(blog.db.insert(blog.Post), rows)
+                rows = []
+        if rows:
+            blog.db.session.execute(blog.db.insert(blog.Post), rows)
+        blog.db.session.commit()
+        post_ids = [row.id for row in blog.db.session.query(blog.Post.id)]
+        blog.recompute_stats()
+    return post_ids, time.perf_counter() - started
+
+# --------------------- Measurement --------------------- #
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'duration_seconds': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 2) if duration else None,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(latencies[-1]) if latencies else None
+        }
+    }
+
+# Runs `operation(session, i)` `count` times across `concurrency` threads,
+# each with its own HTTP session. `operation` returns True on success.
+def measure(name, operation, count, concurrency, warmup, make_session):
+    local = threading.local()
+
+    def run(i):
+        if not hasattr(local, 'session'):
+            local.session = make_session()
+        started = time.perf_counter()
+        try:
+            ok = operation(local.session, i)
+        except requests.RequestException:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, range(warmup)))
+        started = time.perf_counter()
+        outcomes = list(pool.map(run, range(count)))
+        duration = time.perf_counter() - started
+    result = summarize([elapsed for ok, elapsed in outcomes if ok], sum(1 for ok, _ in outcomes if not ok), duration)
+    latency = result['latency_ms']
+    print(f"{name:<30} {result['throughput_rps']:>9} req/s  p50 {latency['p50']} ms  p95 {latency['p95']} ms  "
+          f"p99 {latency['p99']} ms  errors {result['errors']}")
+    return result
+
+def run_benchmarks(args, app, blog, base_url, post_ids):
+    def make_session():
+        return requests.Session()
+
+    def login(session):
+        username = f"bench_user_{random.randrange(args.users)}"
+        session.post(f"{base_url}/api/login", json={'username': username, 'password': 'bench'}).raise_for_status()
+
+    def get_posts(session, i):
+        return session.get(f"{base_url}/api/posts").status_code == 200
+
+    def get_posts_query(session, i):
+        query = ' '.join(random.sample(WORDS, random.choice((1, 2))))
+        return session.get(f"{base_url}/api/posts", params={'query': query}).status_code == 200
+
+    def get_post(session, i):
+        return session.get(f"{base_url}/api/posts/{random.choice(post_ids)}").status_code == 200
+
+    def get_global_stats(session, i):
+        return session.get(f"{base_url}/api/stats").status_code == 200
+
+    # Submit a job and poll it to completion; unique prompts miss the AI cache
+    def generate_ai_post_manual(session, i):
+        if not session.cookies:
+            login(session)
+        response = session.post(f"{base_url}/api/generate_ai_post", json={'prompt': f"Benchmark post {i} {time.time_ns()}"})
+        if response.status_code != 202:
+            return False
+        job = response.json()
+        deadline = time.monotonic() + 60
+        while job['status'] in ('queued', 'running') and time.monotonic() < deadline:
+            time.sleep(args.poll_interval_ms / 1000)
+            job = session.get(f"{base_url}/api/generate_ai_post/{job['job_id']}").json()
+        return job['status'] == 'succeeded'
+
+    results = {}
+    for name, operation, count in (
+        ('get_posts', get_posts, args.requests),
+        ('get_posts_query', get_posts_query, args.requests),
+        ('get_post', get_post, args.requests),
+        ('get_global_stats', get_global_stats, args.requests),
+        ('generate_ai_post_manual', generate_ai_post_manual, args.ai_requests),
+    ):
+        results[name] = measure(name, operation, count, args.concurrency, args.warmup if count == args.requests else 0, make_session)
+
+    with app.app_context():
+        posts_before = blog.Post.query.count()
+        started = time.perf_counter()
+        blog.fetch_news_and_generate_posts()
+        duration = time.perf_counter() - started
+        created = blog.Post.query.count() - posts_before
+    results['fetch_news_and_generate_posts'] = {
+        'requests': 1,
+        'errors': 0 if created else 1,
+        'duration_seconds': round(duration, 3),
+        'posts_created': created
+    }
+    print(f"{'fetch_news_and_generate_posts':<30} {duration:.3f} s  posts created {created}")
+    return results
+
+# --------------------- Reporting --------------------- #
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline_path}):")
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        if 'latency_ms' in result and 'latency_ms' in before:
+            pairs = [('req/s', before['throughput_rps'], result['throughput_rps'])]
+            pairs += [(pct, before['latency_ms'][pct], result['latency_ms'][pct]) for pct in ('p50', 'p95', 'p99')]
+        else:
+            pairs = [('seconds', before['duration_seconds'], result['duration_seconds'])]
+        changes = '  '.join(
+            f"{label} {old} -> {new} ({(new - old) / old * 100:+.1f}%)" if old and new is not None else f"{label} {old} -> {new}"
+            for label, old, new in pairs
+        )
+        print(f"{name:<30} {changes}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the blog API against stubbed upstreams.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per read endpoint')
+    parser.add_argument('--ai-requests', type=int, default=100, help='AI generation jobs to run')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--upstream-latency-ms', type=float, default=50, help='delay added by each stubbed API call')
+    parser.add_argument('--poll-interval-ms', type=float, default=20)
+    parser.add_argument('--database-url', help='benchmark against this database instead of a temporary SQLite file')
+    parser.add_argument('--reset', action='store_true', help='drop all tables in --database-url before seeding')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='results file (default: bench/results/<commit>.json)')
+    parser.add_argument('--compare', help='previous results file to compare against')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='blog-bench-')
+    configure_environment(args, workdir)
+    sys.path.insert(0, ROOT)
+    import app as blog
+    app = blog.create_app()
+
+    if args.reset:
+        if not args.database_url:
+            parser.error('--reset needs --database-url')
+        reset_database(app, blog)
+    with app.app_context():
+        database = blog.db.engine.dialect.name
+
+    print(f"Seeding {args.users} users and {args.posts} posts into {os.environ['DATABASE_URL']}")
+    post_ids, seed_seconds = seed_database(app, blog, args.users, args.posts)
+    print(f"Seeded in {seed_seconds:.1f}s")
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = start_server(make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler))
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    results = run_benchmarks(args, app, blog, base_url, post_ids)
+    server.shutdown()
+
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database,
+            'users': args.users,
+            'posts': args.posts,
+            'requests': args.requests,
+            'ai_requests': args.ai_requests,
+            'concurrency': args.concurrency,
+            'upstream_latency_ms': args.upstream_latency_ms,
+            'seed': args.seed
+        },
+        'results': results
+    }
+    output = args.output or os.path.join(ROOT, 'bench', 'results', f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -8,16 +8,37 @@ const AppState = {
     trendingAiPosts: [],
     currentView: 'landingPage',
     currentUserId: null,
+    feed: null, // Paginated list currently on screen: { url, renderCard, nextCursor, items }
     currentTheme: localStorage.getItem('theme') || 'light',
 };
 
+// GET responses that carried an ETag, replayed when the server answers 304
+const responseCache = new Map(); // url -> { etag, data }
+const RESPONSE_CACHE_LIMIT = 100;
+
+function rememberResponse(url, etag, data) {
+    responseCache.delete(url);
+    responseCache.set(url, { etag, data });
+    if (responseCache.size > RESPONSE_CACHE_LIMIT) {
+        responseCache.delete(responseCache.keys().next().value);
+    }
+}
+
 // Utility function to make API calls with error handling
 async function apiCall(url, method = 'GET', body = null) {
     const options = { method, headers: { 'Content-Type': 'application/json' } };
     if (body) options.body = JSON.stringify(body);
 
+    // Revalidate ourselves so a 304 reaches us instead of the browser cache
+    const cached = method === 'GET' ? responseCache.get(url) : null;
+    if (method === 'GET') options.cache = 'no-store';
+    if (cached) options.headers['If-None-Match'] = cached.etag;
+
     try {
         const res = await fetch(url, options);
+        if (res.status === 304 && cached) {
+            return cached.data;
+        }
         const contentType = res.headers.get('content-type');
 
         if (!contentType || !contentType.includes('application/json')) {
@@ -29,6 +50,8 @@ async function apiCall(url, method = 'GET', body = null) {
 
         const data = await res.json();
         if (res.ok) {
+            const etag = res.headers.get('ETag');
+            if (method === 'GET' && etag) rememberResponse(url, etag, data);
             // Special handling for user data updates from auth, or post creation
             if (url.startsWith('/api/login') || url.startsWith('/api/signup') || url.startsWith('/api/me')) {
                 AppState.user = data; // Data IS the user object
@@ -56,6 +79,47 @@ async function apiCall(url, method = 'GET', body = null) {
     }
 }
 
+// ---------------------- PAGINATED FEEDS ---------------------- //
+
+// List endpoints return { posts, next_cursor }; "Load More" follows next_cursor.
+const FEED_PAGE_SIZE = 20;
+
+function feedUrl(base, params = {}) {
+    const search = new URLSearchParams({ limit: FEED_PAGE_SIZE });
+    Object.entries(params).forEach(([key, value]) => {
+        if (value) search.set(key, value);
+    });
+    return `${base}?${search.toString()}`;
+}
+
+async function startFeed(url, renderCard) {
+    const page = await apiCall(url);
+    AppState.feed = { url, renderCard, nextCursor: page.next_cursor, items: page.posts };
+    return page;
+}
+
+function renderLoadMoreButton() {
+    return AppState.feed && AppState.feed.nextCursor
+        ? `<button class="btn btn-outline-secondary" onclick="loadMorePosts()">Load More</button>`
+        : '';
+}
+
+async function loadMorePosts() {
+    const feed = AppState.feed;
+    if (!feed || !feed.nextCursor) return;
+    const loadMore = document.getElementById('load-more-container');
+    loadMore.innerHTML = `<div class="spinner-border spinner-border-sm" role="status"></div>`;
+    try {
+        const page = await apiCall(`${feed.url}&cursor=${encodeURIComponent(feed.nextCursor)}`);
+        feed.nextCursor = page.next_cursor;
+        feed.items = feed.items.concat(page.posts);
+        document.getElementById('posts-row').insertAdjacentHTML('beforeend', page.posts.map(feed.renderCard).join(''));
+        loadMore.innerHTML = renderLoadMoreButton();
+    } catch (error) {
+        console.error("Failed to load more posts:", error);
+    }
+}
+
 // ---------------------- UI RENDER FUNCTIONS ---------------------- //
 
 function renderLoading() {
@@ -145,16 +209,46 @@ function updateThemeIcons() {
 }
 
 
+// Local WebP variants (with a blurred placeholder) once the server has
+// processed the image, otherwise the original URL
+function renderPostImage(post, sizes) {
+    if (post.image) {
+        const { src, srcset, width, height, placeholder } = post.image;
+        return `<img src="${src}" srcset="${srcset}" sizes="${sizes}" width="${width}" height="${height}" loading="lazy" decoding="async" class="card-img-top post-img" style="background: url('${placeholder}') center / cover no-repeat">`;
+    }
+    return post.image_url ? `<img src="${post.image_url}" class="card-img-top post-img" loading="lazy">` : '';
+}
+
+function renderFeedCard(post) {
+    return `
+        <div class="col-md-4 mb-4">
+            <div class="card post-card">
+                ${renderPostImage(post, '(min-width: 768px) 33vw, 100vw')}
+                <div class="card-body">
+                    <h5 class="card-title">${post.title} ${post.is_ai_generated ? '<span class="badge bg-primary ms-1">AI</span>' : ''}</h5>
+                    <p class="card-text">${post.snippet || post.excerpt}</p>
+                    <p class="card-text text-muted small">
+                        By: <a class="clickable" onclick="renderUserPosts(${post.user_id})">${post.username}</a>
+                        <span class="ms-2">Views: ${post.views || 0}</span>
+                    </p>
+                    <a class="btn btn-sm btn-outline-primary" onclick="renderSinglePost(${post.id})">Read More</a>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
 async function renderPostsList(query = '') {
     AppState.currentView = 'allPosts';
     AppState.currentUserId = null;
     renderLoading();
     try {
-        const [posts, globalStats] = await Promise.all([
-            apiCall(`/api/posts${query ? `?query=${encodeURIComponent(query)}` : ''}`),
+        const [page, globalStats] = await Promise.all([
+            startFeed(feedUrl('/api/posts', { query }), renderFeedCard),
             apiCall('/api/stats')
         ]);
-        AppState.posts = posts;
+        const posts = page.posts;
+        AppState.posts = AppState.feed.items;
         AppState.globalStats = globalStats;
 
         const container = document.getElementById('app');
@@ -172,24 +266,10 @@ async function renderPostsList(query = '') {
 
             ${posts.length === 0 ? `<p class="text-center">No posts found.${query ? ' Try a different search term.' : ''}</p>` : ''}
 
-            <div class="row">
-                ${posts.map(post => `
-                    <div class="col-md-4 mb-4">
-                        <div class="card post-card">
-                            ${post.image_url ? `<img src="${post.image_url}" class="card-img-top post-img">` : ''}
-                            <div class="card-body">
-                                <h5 class="card-title">${post.title} ${post.is_ai_generated ? '<span class="badge bg-primary ms-1">AI</span>' : ''}</h5>
-                                <p class="card-text">${post.content.replace(/<[^>]*>?/gm, '').slice(0, 100)}...</p>
-                                <p class="card-text text-muted small">
-                                    By: <a class="clickable" onclick="renderUserPosts(${post.user_id})">${post.username}</a>
-                                    <span class="ms-2">Views: ${post.views || 0}</span>
-                                </p>
-                                <a class="btn btn-sm btn-outline-primary" onclick="renderSinglePost(${post.id})">Read More</a>
-                            </div>
-                        </div>
-                    </div>
-                `).join('')}
+            <div class="row" id="posts-row">
+                ${posts.map(renderFeedCard).join('')}
             </div>
+            <div class="text-center mb-4" id="load-more-container">${renderLoadMoreButton()}</div>
         `;
     } catch (error) {
         console.error("Failed to render post list:", error);
@@ -215,7 +295,7 @@ async function renderSinglePost(id) {
 
         container.innerHTML = `
             <div class="card">
-                ${post.image_url ? `<img src="${post.image_url}" class="card-img-top post-img">` : ''}
+                ${renderPostImage(post, '100vw')}
                 <div class="card-body">
                     <h3>${post.title} ${post.is_ai_generated ? '<span class="badge bg-primary ms-2">AI Generated</span>' : ''}</h3>
                     <p class="text-muted small">
@@ -583,6 +663,71 @@ function renderAIGenerateForm() {
     `;
 }
 
+// Generation runs as a background job on the server; poll until it settles
+const AI_JOB_POLL_INTERVAL_MS = 1500;
+
+async function waitForAIJob(job) {
+    while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, AI_JOB_POLL_INTERVAL_MS));
+        job = await apiCall(`/api/generate_ai_post/${job.job_id}`);
+    }
+    return job;
+}
+
+// Streams the generation over Server-Sent Events, calling onDelta({ field, text })
+// as title/content arrive. Resolves with the final post or { error }.
+async function streamAIPost(prompt, onDelta) {
+    const res = await fetch('/api/generate_ai_post/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ prompt })
+    });
+    if (!res.ok) {
+        const data = await res.json().catch(() => ({}));
+        return { error: data.error || `Request failed with status ${res.status}` };
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const event = parseSSEFrame(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            if (event.type === 'delta') {
+                onDelta(event.data);
+            } else if (event.type === 'done' || event.type === 'error') {
+                return event.data;
+            }
+        }
+    }
+    return { error: 'Generation stream ended unexpectedly.' };
+}
+
+function parseSSEFrame(frame) {
+    let type = 'message';
+    const dataLines = [];
+    frame.split('\n').forEach(line => {
+        if (line.startsWith('event:')) type = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+    });
+    return { type, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
+}
+
+function renderAIStreamPreview() {
+    document.getElementById('app').innerHTML = `
+        <div class="form-container">
+            <h3><span class="spinner-border spinner-border-sm me-2" role="status"></span>Generating...</h3>
+            <h4 id="ai-stream-title" class="mt-3"></h4>
+            <div id="ai-stream-content" class="post-content-html"></div>
+        </div>
+    `;
+}
+
 async function generatePostWithAI() {
     const prompt = document.getElementById('ai-prompt').value;
     if (!prompt.trim()) {
@@ -590,12 +735,29 @@ async function generatePostWithAI() {
         return;
     }
 
-    renderLoading();
-
     try {
-        const response = await apiCall('/api/generate_ai_post', 'POST', { prompt });
+        let response;
+        if (window.ReadableStream && window.TextDecoder) {
+            renderAIStreamPreview();
+            const partial = { title: '', content: '' };
+            response = await streamAIPost(prompt, ({ field, text }) => {
+                partial[field] += text;
+                if (field === 'title') {
+                    document.getElementById('ai-stream-title').textContent = partial.title;
+                } else {
+                    document.getElementById('ai-stream-content').innerHTML = partial.content;
+                }
+            });
+        } else {
+            // No streaming support: fall back to the background job API
+            renderLoading();
+            const job = await apiCall('/api/generate_ai_post', 'POST', { prompt });
+            response = await waitForAIJob(job);
+        }
+        await apiCall('/api/me'); // Quota may have been refunded if generation failed
         if (response.error) {
-            // Error is handled by apiCall, but return to form
+            // Stream and job errors arrive as data, so apiCall hasn't alerted yet
+            alert(`Error: ${response.error}`);
             // Special handling for "limit reached" error message
             if (response.error.includes('limit reached')) {
                  document.getElementById('app').innerHTML = `
@@ -634,12 +796,35 @@ async function generatePostWithAI() {
 
 // ---------------------- MY POSTS SECTION ---------------------- //
 
+function renderMyPostCard(post) {
+    return `
+        <div class="col-md-6 mb-4">
+            <div class="card post-card">
+                ${renderPostImage(post, '(min-width: 768px) 50vw, 100vw')}
+                <div class="card-body">
+                    <h5 class="card-title">${post.title} ${post.is_ai_generated ? '<span class="badge bg-primary ms-1">AI</span>' : ''}</h5>
+                    <p class="card-text">${post.snippet || post.excerpt}</p>
+                    <p class="card-text text-muted small">By: <a class="clickable" onclick="renderUserPosts(${post.user_id})">${post.username}</a>
+                    <span class="ms-2">Views: ${post.views || 0}</span>
+                    </p>
+                    <div class="mt-3">
+                        <a class="btn btn-sm btn-outline-primary me-2" onclick="renderSinglePost(${post.id})">View</a>
+                        <a class="btn btn-sm btn-warning me-2" onclick="renderEditPostForm(${post.id})">Edit</a>
+                        <a class="btn btn-sm btn-danger" onclick="deletePost(${post.id})">Delete</a>
+                    </div>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
 async function renderMyPostsList() {
     AppState.currentView = 'myPosts';
     renderLoading();
     try {
-        const myPosts = await apiCall('/api/me/posts');
-        AppState.myPosts = myPosts;
+        const page = await startFeed(feedUrl('/api/me/posts'), renderMyPostCard);
+        const myPosts = page.posts;
+        AppState.myPosts = AppState.feed.items;
 
         const container = document.getElementById('app');
         if (myPosts.length === 0) {
@@ -655,27 +840,10 @@ async function renderMyPostsList() {
 
         container.innerHTML = `
             <h3>My Posts</h3>
-            <div class="row">
-                ${myPosts.map(post => `
-                    <div class="col-md-6 mb-4">
-                        <div class="card post-card">
-                            ${post.image_url ? `<img src="${post.image_url}" class="card-img-top post-img">` : ''}
-                            <div class="card-body">
-                                <h5 class="card-title">${post.title} ${post.is_ai_generated ? '<span class="badge bg-primary ms-1">AI</span>' : ''}</h5>
-                                <p class="card-text">${post.content.replace(/<[^>]*>?/gm, '').slice(0, 100)}...</p>
-                                <p class="card-text text-muted small">By: <a class="clickable" onclick="renderUserPosts(${post.user_id})">${post.username}</a>
-                                <span class="ms-2">Views: ${post.views || 0}</span>
-                                </p>
-                                <div class="mt-3">
-                                    <a class="btn btn-sm btn-outline-primary me-2" onclick="renderSinglePost(${post.id})">View</a>
-                                    <a class="btn btn-sm btn-warning me-2" onclick="renderEditPostForm(${post.id})">Edit</a>
-                                    <a class="btn btn-sm btn-danger" onclick="deletePost(${post.id})">Delete</a>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                `).join('')}
+            <div class="row" id="posts-row">
+                ${myPosts.map(renderMyPostCard).join('')}
             </div>
+            <div class="text-center mb-4" id="load-more-container">${renderLoadMoreButton()}</div>
         `;
     } catch (error) {
         console.error("Failed to render user's posts:", error);
@@ -685,15 +853,34 @@ async function renderMyPostsList() {
 
 // ---------------------- USER'S PUBLIC POSTS PAGE ---------------------- //
 
+function renderUserPostCard(post) {
+    return `
+        <div class="col-md-4 mb-4">
+            <div class="card post-card">
+                ${renderPostImage(post, '(min-width: 768px) 33vw, 100vw')}
+                <div class="card-body">
+                    <h5 class="card-title">${post.title} ${post.is_ai_generated ? '<span class="badge bg-primary ms-1">AI</span>' : ''}</h5>
+                    <p class="card-text">${post.snippet || post.excerpt}</p>
+                    <p class="card-text text-muted small">By: ${post.username}
+                    <span class="ms-2">Views: ${post.views || 0}</span>
+                    </p>
+                    <a class="btn btn-sm btn-outline-primary" onclick="renderSinglePost(${post.id})">Read More</a>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
 async function renderUserPosts(userId, query = '') {
     AppState.currentView = 'userPosts';
     AppState.currentUserId = userId;
     renderLoading();
 
     try {
-        const userPosts = await apiCall(`/api/users/${userId}/posts${query ? `?query=${encodeURIComponent(query)}` : ''}`);
-        
-        const username = userPosts.length > 0 ? userPosts[0].username : 'Unknown User';
+        const page = await startFeed(feedUrl(`/api/users/${userId}/posts`, { query }), renderUserPostCard);
+        const userPosts = page.posts;
+
+        const username = page.username || 'Unknown User';
 
         const container = document.getElementById('app');
         container.innerHTML = `
@@ -707,23 +894,10 @@ async function renderUserPosts(userId, query = '') {
 
             ${userPosts.length === 0 ? `<p class="text-center">No posts found for this user.${query ? ' Try a different search term.' : ''}</p>` : ''}
 
-            <div class="row">
-                ${userPosts.map(post => `
-                    <div class="col-md-4 mb-4">
-                        <div class="card post-card">
-                            ${post.image_url ? `<img src="${post.image_url}" class="card-img-top post-img">` : ''}
-                            <div class="card-body">
-                                <h5 class="card-title">${post.title} ${post.is_ai_generated ? '<span class="badge bg-primary ms-1">AI</span>' : ''}</h5>
-                                <p class="card-text">${post.content.replace(/<[^>]*>?/gm, '').slice(0, 100)}...</p>
-                                <p class="card-text text-muted small">By: ${post.username}
-                                <span class="ms-2">Views: ${post.views || 0}</span>
-                                </p>
-                                <a class="btn btn-sm btn-outline-primary" onclick="renderSinglePost(${post.id})">Read More</a>
-                            </div>
-                        </div>
-                    </div>
-                `).join('')}
+            <div class="row" id="posts-row">
+                ${userPosts.map(renderUserPostCard).join('')}
             </div>
+            <div class="text-center mb-4" id="load-more-container">${renderLoadMoreButton()}</div>
         `;
     } catch (error) {
         console.error("Failed to render user's public posts:", error);
@@ -938,7 +1112,7 @@ async function renderLandingPage() {
                     ${AppState.trendingAiPosts.map(post => `
                         <div class="col-md-4 mb-4">
                             <div class="card post-card">
-                                ${post.image_url ? `<img src="${post.image_url}" class="card-img-top post-img">` : ''}
+                                ${renderPostImage(post, '(min-width: 768px) 33vw, 100vw')}
                                 <div class="card-body">
                                     <h5 class="card-title">${post.title}</h5>
                                     <p class="card-text">${post.content.replace(/<[^>]*>?/gm, '').slice(0, 100)}...</p>
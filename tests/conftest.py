@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads its configuration at import time
+os.environ['RUN_SCHEDULER'] = '0'
+os.environ.setdefault('API_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'api_cache.db'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as blog
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'blog.db'}"
+
+
+@pytest.fixture
+def make_app(database_url):
+    def make(**config):
+        return blog.create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': database_url, **config})
+    return make
+
+
+# Caches live at module level, so they would outlast each test's database
+@pytest.fixture
+def app(make_app, monkeypatch):
+    monkeypatch.setattr(blog, 'response_cache', blog.ResponseCache(blog.RESPONSE_CACHE_MAX_BYTES))
+    blog.invalidate_read_caches()
+    return make_app()
+
+
+# Records every SQL statement run through the app's engine while active
+@pytest.fixture
+def sql_statements(app):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = blog.db.engine
+    blog.event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    blog.event.remove(engine, 'before_cursor_execute', record)
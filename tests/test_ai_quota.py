@@ -0,0 +1,89 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import blog
+
+
+class FakeStream:
+    def __init__(self, text):
+        self.chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + 8]))])
+            for i in range(0, len(text), 8)
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    completion = json.dumps({'title': 'Streamed title', 'content': 'Streamed body ' * 20})
+    create = lambda **kwargs: FakeStream(completion)
+    monkeypatch.setattr(blog, 'openai_client', SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(blog, 'search_pexels_image', lambda *args, **kwargs: None)
+    monkeypatch.setattr(blog, 'ai_rate_limiter', blog.TokenBucketLimiter(0, 0, 0))
+
+
+@pytest.fixture
+def free_user(app):
+    client = app.test_client()
+    client.post('/api/signup', json={'username': 'free_user', 'password': 'secret'})
+    return client
+
+
+def quota_used(app):
+    with app.app_context():
+        return blog.User.query.filter_by(username='free_user').one().ai_posts_generated_count
+
+
+def test_stream_keeps_quota_slot_once_done_is_sent(app, free_user, fake_openai):
+    response = free_user.post('/api/generate_ai_post/stream', json={'prompt': 'kept'})
+    assert 'event: done' in response.get_data(as_text=True)
+    assert quota_used(app) == 1
+
+
+def test_stream_refunds_quota_slot_when_client_disconnects(app, free_user, fake_openai):
+    response = free_user.post('/api/generate_ai_post/stream', json={'prompt': 'abandoned'}, buffered=False)
+    events = response.iter_encoded()
+    assert next(events).startswith(b'event: start')
+    next(events)
+    response.close()
+    assert quota_used(app) == 0
+
+
+def test_rate_limiter_bucket_table_stays_bounded():
+    limiter = blog.TokenBucketLimiter(60, 2, 100)
+    for user_id in range(1000):
+        assert limiter.acquire(user_id) == 0
+        assert len(limiter.buckets) <= 100
+    assert limiter.acquire(999) == 0
+    assert limiter.acquire(999) > 0
+
+
+def test_job_sweep_refunds_stale_jobs_and_purges_old_ones(app, free_user):
+    now = blog.datetime.utcnow()
+    with app.app_context():
+        user = blog.User.query.filter_by(username='free_user').one()
+        user.ai_posts_generated_count = 2
+        stale_since = now - blog.timedelta(seconds=blog.AI_JOB_STALE_SECONDS + 60)
+        old = now - blog.timedelta(days=blog.AI_JOB_RETENTION_DAYS + 1)
+        blog.db.session.add_all([
+            blog.GenerationJob(id='abandoned', user_id=user.id, prompt='p', status='running', quota_reserved=True, updated_at=stale_since),
+            blog.GenerationJob(id='in-flight', user_id=user.id, prompt='p', status='running', quota_reserved=True, updated_at=now),
+            blog.GenerationJob(id='old', user_id=user.id, prompt='p', status='succeeded', content='body', updated_at=old),
+        ])
+        blog.db.session.commit()
+
+        blog.sweep_ai_jobs()
+
+        jobs = {job.id: job.status for job in blog.GenerationJob.query}
+        assert jobs == {'abandoned': 'failed', 'in-flight': 'running'}
+        assert quota_used(app) == 1
@@ -0,0 +1,27 @@
+import json
+
+from conftest import blog
+
+
+def test_malformed_records_are_counted_without_aborting_the_batch(app):
+    lines = [
+        json.dumps({'title': 'Kept', 'content': 'Body', 'username': 'writer', 'views': 4}),
+        json.dumps({'title': 'Bad author', 'content': 'Body', 'username': ['x']}),
+        json.dumps({'title': 'Bad image', 'content': 'Body', 'image_url': {'src': 'x'}}),
+        json.dumps({'title': 'Long image', 'content': 'Body', 'image_url': 'x' * 301}),
+        json.dumps({'title': 'Bad views', 'content': 'Body', 'views': float('inf')}),
+        json.dumps({'title': 'Negative views', 'content': 'Body', 'views': -1}),
+        json.dumps({'title': 'Also kept', 'content': 'Other body'}),
+    ]
+    with app.app_context():
+        author = blog.User(username='writer', password='secret')
+        blog.db.session.add(author)
+        blog.db.session.commit()
+
+        *_, totals = blog.import_posts(lines, default_user_id=author.id, batch_size=10)
+
+        assert (totals['processed'], totals['inserted'], totals['errors']) == (7, 2, 5)
+        assert [sample['line'] for sample in totals['error_samples']] == [2, 3, 4, 5, 6]
+        posts = {post.title: post for post in blog.Post.query}
+        assert set(posts) == {'Kept', 'Also kept'}
+        assert posts['Kept'].views == 4
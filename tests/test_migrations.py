@@ -0,0 +1,58 @@
+import sqlite3
+
+from conftest import blog
+
+# The schema the first release created with db.create_all()
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL,
+    username VARCHAR(100) NOT NULL,
+    password VARCHAR(100) NOT NULL,
+    is_premium BOOLEAN NOT NULL,
+    ai_posts_generated_count INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (username)
+);
+CREATE TABLE post (
+    id INTEGER NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    content TEXT NOT NULL,
+    image_url VARCHAR(300),
+    user_id INTEGER NOT NULL,
+    views INTEGER NOT NULL,
+    is_ai_generated BOOLEAN NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user (id)
+);
+INSERT INTO user VALUES (1, 'alice', 'secret', 0, 2);
+INSERT INTO user VALUES (2, 'bob', 'secret', 1, 0);
+INSERT INTO post VALUES (1, 'First post', '<p>Hello world</p>', NULL, 1, 7, 0, '2024-01-01 10:00:00.000000');
+INSERT INTO post VALUES (2, 'Second post', '<p>Machine written</p>', NULL, 2, 3, 1, '2024-01-02 10:00:00.000000');
+"""
+
+
+def test_baseline_database_is_migrated_with_its_data(tmp_path, make_app):
+    connection = sqlite3.connect(tmp_path / 'blog.db')
+    connection.executescript(BASELINE_SCHEMA)
+    connection.close()
+
+    app = make_app()
+
+    with app.app_context():
+        applied = {version for (version,) in blog.db.session.query(blog.SchemaMigration.version)}
+        assert applied == {version for version, _, _ in blog.MIGRATIONS}
+
+        post_indexes = {index['name'] for index in blog.db.inspect(blog.db.engine).get_indexes('post')}
+        assert {index.name for index in blog.Post.__table__.indexes} <= post_indexes
+
+        alice = blog.User.query.filter_by(username='alice').one()
+        assert (alice.ai_posts_generated_count, alice.posts_count, alice.views_count) == (2, 1, 7)
+        first = blog.db.session.get(blog.Post, 1)
+        assert first.content_hash == blog.post_content_hash(first.title, first.content)
+
+    client = app.test_client()
+    listing = client.get('/api/posts').get_json()['posts']
+    assert [post['title'] for post in listing] == ['Second post', 'First post']
+    assert [post['title'] for post in client.get('/api/posts?query=hello').get_json()['posts']] == ['First post']
+    assert client.get('/api/stats').get_json()['total_views'] == 10
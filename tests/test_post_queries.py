@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import blog
+
+
+@pytest.fixture
+def seeded_app(app):
+    with app.app_context():
+        authors = [blog.User(username=f"author_{i}", password='secret') for i in range(5)]
+        blog.db.session.add_all(authors)
+        blog.db.session.flush()
+        started = datetime(2024, 1, 1)
+        blog.db.session.add_all([
+            blog.Post(
+                title=f"Post {i}",
+                content=f"<p>Body of post {i}</p>",
+                user_id=authors[i % len(authors)].id,
+                created_at=started + timedelta(minutes=i)
+            )
+            for i in range(150)
+        ])
+        blog.db.session.commit()
+    # The first request ever creates the table_version rows
+    app.test_client().get('/api/posts')
+    return app
+
+
+def count_listing_queries(app, sql_statements, url):
+    # Start cold each time: no cached response or table versions
+    blog.invalidate_read_caches()
+    del sql_statements[:]
+    response = app.test_client().get(url)
+    assert response.status_code == 200
+    return len(sql_statements), response.get_json()['posts']
+
+
+@pytest.mark.parametrize('view', ['summary', 'full'])
+def test_post_listing_query_count_is_independent_of_page_size(seeded_app, sql_statements, view):
+    small_count, small_page = count_listing_queries(seeded_app, sql_statements, f"/api/posts?limit=5&view={view}")
+    large_count, large_page = count_listing_queries(seeded_app, sql_statements, f"/api/posts?limit=100&view={view}")
+
+    assert len(small_page) == 5
+    assert len(large_page) == 100
+    assert {post['username'] for post in large_page} == {f"author_{i}" for i in range(5)}
+    assert small_count == large_count
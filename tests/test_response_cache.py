@@ -0,0 +1,17 @@
+
+def test_if_modified_since_does_not_hide_a_write_in_the_same_second(app):
+    client = app.test_client()
+    client.post('/api/signup', json={'username': 'writer', 'password': 'secret'})
+    first = client.get('/api/posts')
+    assert first.get_json()['posts'] == []
+
+    client.post('/api/posts', json={'title': 'Fresh', 'content': 'Body'})
+    revalidated = client.get('/api/posts', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert revalidated.status_code == 200
+    assert [post['title'] for post in revalidated.get_json()['posts']] == ['Fresh']
+
+
+def test_matching_etag_is_not_modified(app):
+    client = app.test_client()
+    first = client.get('/api/posts')
+    assert client.get('/api/posts', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
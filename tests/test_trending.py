@@ -0,0 +1,41 @@
+import pytest
+
+from conftest import blog
+
+
+@pytest.fixture
+def trending(app, monkeypatch):
+    # A fresh engine whose background thread only loads, never snapshots
+    engine = blog.TrendingEngine(blog.TRENDING_WINDOWS, blog.TRENDING_MAX_K, 3600)
+    engine.init_app(app)
+    monkeypatch.setattr(blog, 'trending', engine)
+    with app.app_context():
+        author = blog.User(username='writer', password='secret')
+        blog.db.session.add(author)
+        blog.db.session.flush()
+        posts = [blog.Post(title=f"Post {i}", content='Body', user_id=author.id, is_ai_generated=True) for i in range(3)]
+        blog.db.session.add_all(posts)
+        blog.db.session.flush()
+        now_exponent = engine.exponent('24h')
+        blog.db.session.add_all([
+            blog.TrendingScore(post_id=post.id, time_window='24h', is_ai_generated=True, log_score=now_exponent + i)
+            for i, post in enumerate(posts)
+        ])
+        blog.db.session.commit()
+        engine.post_ids = [post.id for post in posts]
+    return engine
+
+
+def test_trending_request_does_not_write(app, trending, sql_statements):
+    response = app.test_client().get('/api/trending_ai_posts?window=24h')
+    assert response.status_code == 200
+    trending_writes = [
+        statement for statement in sql_statements
+        if 'trending_score' in statement and not statement.lstrip().upper().startswith('SELECT')
+    ]
+    assert trending_writes == []
+
+
+def test_trending_ranking_loads_from_table(trending):
+    assert trending.load()
+    assert [post_id for post_id, _ in trending.top('24h', 3, ai_only=True)] == trending.post_ids[::-1]
@@ -0,0 +1,66 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from conftest import blog
+
+SECRET = 'test-webhook-secret'
+
+
+@pytest.fixture
+def customer(app, monkeypatch):
+    monkeypatch.setattr(blog, 'FASTSPRING_WEBHOOK_SECRET', SECRET)
+    with app.app_context():
+        user = blog.User(username='customer', password='secret', ai_posts_generated_count=3)
+        blog.db.session.add(user)
+        blog.db.session.commit()
+        return user.id
+
+
+def delivery(user_id):
+    return json.dumps({'events': [{'id': 'evt-1', 'type': 'order.completed', 'data': {'tags': [f"user_id_{user_id}"]}}]}).encode()
+
+
+def sign(body, secret=SECRET):
+    return base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+
+
+def post_delivery(app, body, signature=None):
+    headers = {'Content-Type': 'application/json'}
+    if signature:
+        headers['X-FS-Signature'] = signature
+    return app.test_client().post('/api/fastspring/webhook', data=body, headers=headers)
+
+
+def premium_state(app, user_id):
+    with app.app_context():
+        blog.webhook_processor.process_pending()
+        user = blog.db.session.get(blog.User, user_id)
+        return user.is_premium, user.ai_posts_generated_count
+
+
+@pytest.mark.parametrize('signature', [None, 'bogus', sign(b'another body'), 'wrong-secret'])
+def test_webhook_without_valid_signature_is_rejected(app, customer, signature):
+    body = delivery(customer)
+    if signature == 'wrong-secret':
+        signature = sign(body, 'not-the-secret')
+    assert post_delivery(app, body, signature).status_code == 401
+    assert premium_state(app, customer) == (False, 3)
+    with app.app_context():
+        assert blog.WebhookEvent.query.count() == 0
+
+
+def test_signed_webhook_grants_premium_once(app, customer):
+    body = delivery(customer)
+    assert post_delivery(app, body, sign(body)).status_code == 200
+    assert premium_state(app, customer) == (True, 0)
+
+    with app.app_context():
+        blog.db.session.get(blog.User, customer).ai_posts_generated_count = 2
+        blog.db.session.commit()
+    # A retried delivery of the same event is not applied again
+    assert post_delivery(app, body, sign(body)).status_code == 200
+    assert premium_state(app, customer) == (True, 2)